@@ -0,0 +1,61 @@
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse
+
+STREAM = 'stream'
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+X_SENDFILE = 'x-sendfile'
+UNKNOWN_BACKEND_MSG = 'Неизвестный FILE_DELIVERY_BACKEND: {backend}.'
+
+
+def get_content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def get_protected_path(path):
+    """ Путь файла относительно PROTECTED_ROOT или None, если он вне его. """
+
+    root = os.path.realpath(settings.PROTECTED_ROOT)
+    path = os.path.realpath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return os.path.relpath(path, root)
+
+
+def send_file(path, filename, content_type='application/octet-stream'):
+    """
+    Ответ с файлом из PROTECTED_ROOT; доступ к нему проверяется до вызова.
+
+    При FILE_DELIVERY_BACKEND=x-accel-redirect (nginx) или x-sendfile
+    (Apache, lighttpd) ответ содержит только заголовок с расположением
+    файла, а передачу выполняет веб-сервер. По умолчанию (stream) файл
+    отдаётся самим Django - для локальной разработки, а также при
+    x-accel-redirect, если файл лежит вне PROTECTED_ROOT (например,
+    PDF_JOBS_DIR задан отдельно): nginx его не найдёт.
+    """
+
+    backend = settings.FILE_DELIVERY_BACKEND
+    relative_path = None
+    if backend == X_ACCEL_REDIRECT:
+        relative_path = get_protected_path(path)
+    if backend == STREAM or (backend == X_ACCEL_REDIRECT
+                             and relative_path is None):
+        return FileResponse(open(path, 'rb'), as_attachment=True,
+                            filename=filename, content_type=content_type)
+    response = HttpResponse(content_type=content_type)
+    response['Content-Disposition'] = get_content_disposition(filename)
+    if backend == X_ACCEL_REDIRECT:
+        response['X-Accel-Redirect'] = quote(
+            settings.PROTECTED_URL + relative_path.replace(os.sep, '/'))
+    elif backend == X_SENDFILE:
+        response['X-Sendfile'] = os.path.abspath(path)
+    else:
+        raise ImproperlyConfigured(UNKNOWN_BACKEND_MSG.format(backend=backend))
+    return response
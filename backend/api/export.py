@@ -0,0 +1,136 @@
+import io
+import zipfile
+from itertools import chain
+
+from recipes import transfer
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.storage import image_storage
+from users.models import Subscription
+
+from .renderers import FastJSONRenderer
+
+# Размер фрагментов, которыми ответ отдаётся клиенту.
+WRITE_SIZE = 64 * 1024
+DATA_FILE = 'data.ndjson'
+IMAGES_DIR = transfer.ARCHIVE_IMAGES_DIR
+
+_renderer = FastJSONRenderer()
+
+
+def encode_record(record_type, data):
+    return _renderer.render({'type': record_type, 'data': data}) + b'\n'
+
+
+def get_recipe_records(user, image_value):
+    for recipe in transfer.get_recipe_records(
+            Recipe.objects.filter(author=user), image_value):
+        yield encode_record(transfer.RECIPE_TYPE, recipe)
+
+
+def get_relation_records(user):
+    relations = (
+        ('favorite', Favorite.objects.filter(user=user).values(
+            'recipe_id', 'recipe__name')),
+        ('shopping_cart', ShoppingCart.objects.filter(user=user).values(
+            'recipe_id', 'recipe__name')),
+        ('subscription', Subscription.objects.filter(user=user).values(
+            'author_id', 'author__username')),
+    )
+    for record_type, queryset in relations:
+        for data in queryset.order_by('id').iterator(
+                chunk_size=transfer.CHUNK_SIZE):
+            yield encode_record(record_type, data)
+
+
+def stream_ndjson(user, request):
+    """ NDJSON без файлов: изображения рецептов - ссылки. """
+
+    def image_url(name):
+        return request.build_absolute_uri(image_storage.url(name))
+
+    pending = []
+    size = 0
+    for record in chain(get_recipe_records(user, image_url),
+                        get_relation_records(user)):
+        pending.append(record)
+        size += len(record)
+        if size >= WRITE_SIZE:
+            yield b''.join(pending)
+            pending.clear()
+            size = 0
+    if pending:
+        yield b''.join(pending)
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Приёмник для ZipFile без поддержки seek: записанные байты копятся
+    до вызова drain и отдаются клиенту, поэтому архив не хранится целиком.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self, min_size=0):
+        if self.size < min_size or not self.size:
+            return None
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+def copy_to_member(stream, member, blocks):
+    """ Запись в файл архива с отдачей накопленных байт клиенту. """
+
+    for block in blocks:
+        member.write(block)
+        data = stream.drain(WRITE_SIZE)
+        if data:
+            yield data
+
+
+def stream_zip(user):
+    """
+    ZIP-архив: data.ndjson с рецептами, избранным, списком покупок и
+    подписками и изображения рецептов, которые копируются из хранилища
+    по WRITE_SIZE байт.
+    """
+
+    def image_path(name):
+        return f'{IMAGES_DIR}/{name}' if name else None
+
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(DATA_FILE, 'w', force_zip64=True) as member:
+            yield from copy_to_member(stream, member, chain(
+                get_recipe_records(user, image_path),
+                get_relation_records(user)))
+
+        images = Recipe.objects.filter(author=user).exclude(
+            image='').order_by('image').values_list(
+                'image', flat=True).distinct().iterator(
+                    chunk_size=transfer.CHUNK_SIZE)
+        for name in images:
+            try:
+                source = image_storage.open(name, 'rb')
+            except FileNotFoundError:
+                continue
+            info = zipfile.ZipInfo(image_path(name))
+            # Изображения уже сжаты.
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w') as member:
+                yield from copy_to_member(stream, member, iter(
+                    lambda: source.read(WRITE_SIZE), b''))
+    data = stream.drain()
+    if data:
+        yield data
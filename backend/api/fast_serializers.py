@@ -0,0 +1,253 @@
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import Count, F, Window
+from django.db.models.expressions import OrderBy
+from django.db.models.functions import RowNumber
+
+from recipes.memberships import get_memberships
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from recipes.reference import get_reference_data
+from users.models import Subscription, User
+
+from .mixins import get_sparse_field_names
+
+RECIPE_STORAGE = Recipe._meta.get_field('image').storage
+USER_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name')
+RECIPE_COLUMNS = ('author_id', 'id', 'name', 'image', 'cooking_time')
+
+
+class FastReadSerializer:
+    """
+    Базовый класс сериализаторов только для чтения, которые собирают ответ
+    из строк `.values()` в обычные словари. Порядок ключей и значения
+    совпадают с соответствующими DRF-сериализаторами.
+
+    Поля ответа отбираются параметрами ?fields= и ?omit=; row_fields -
+    колонки, которые нужно запросить через `.values()` для этих полей.
+    """
+
+    field_names = ()
+    # Поле ответа -> колонки строки, нужные для его построения.
+    field_columns = {}
+
+    def __init__(self, instance=None, context=None):
+        self.instance = instance
+        self.context = context or {}
+        self.fields = get_sparse_field_names(self.request, self.field_names)
+
+    @property
+    def row_fields(self):
+        columns = ['id']
+        for name in self.fields:
+            for column in self.field_columns.get(name, ()):
+                if column not in columns:
+                    columns.append(column)
+        return tuple(columns)
+
+    @property
+    def request(self):
+        return self.context.get('request')
+
+    @property
+    def user(self):
+        request = self.request
+        return request.user if request is not None else None
+
+    def build_image_url(self, name):
+        if not name:
+            return None
+        url = RECIPE_STORAGE.url(name)
+        if self.request is not None:
+            return self.request.build_absolute_uri(url)
+        return url
+
+    def get_subscribed_ids(self):
+        return get_memberships(self.request, Subscription)
+
+    def get_field_builders(self, rows):
+        """
+        Функции построения вычисляемых полей по строке; остальные поля
+        берутся из строки как есть. Данные запрашиваются только для
+        отобранных полей.
+        """
+
+        return {}
+
+    def to_representation(self, rows):
+        if not rows:
+            return []
+        builders = self.get_field_builders(rows)
+        return [
+            {
+                name: builders[name](row) if name in builders else row[name]
+                for name in self.fields
+            }
+            for row in rows
+        ]
+
+    @property
+    def data(self):
+        return self.to_representation(list(self.instance))
+
+
+class FastRecipeListSerializer(FastReadSerializer):
+    """ Быстрый аналог RecipeListSerializer(many=True). """
+
+    field_names = ('id', 'tags', 'author', 'ingredients',
+                   'is_favorited', 'is_in_shopping_cart',
+                   'name', 'image', 'text', 'cooking_time',)
+    field_columns = {
+        'author': ('author_id',),
+        'name': ('name',),
+        'image': ('image',),
+        'text': ('text',),
+        'cooking_time': ('cooking_time',),
+    }
+
+    def get_tags(self, recipe_ids, reference):
+        tag_ids = defaultdict(list)
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe_id', 'tag_id')
+        for recipe_id, tag_id in rows:
+            tag_ids[recipe_id].append(tag_id)
+        return {
+            recipe_id: reference.tags_to_representation(tag_ids[recipe_id])
+            for recipe_id in recipe_ids
+        }
+
+    def get_ingredients(self, recipe_ids, reference):
+        ingredients = defaultdict(list)
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list('recipe_id', 'ingredient_id', 'amount')
+        for recipe_id, ingredient_id, amount in rows:
+            ingredients[recipe_id].append(
+                reference.ingredient_to_representation(ingredient_id, amount))
+        return ingredients
+
+    def get_authors(self, author_ids):
+        authors = {
+            row['id']: row
+            for row in User.objects.filter(
+                id__in=author_ids).values(*USER_FIELDS)
+        }
+        subscribed = self.get_subscribed_ids()
+        user_id = getattr(self.user, 'id', None)
+        for author_id, row in authors.items():
+            row['is_subscribed'] = (
+                author_id != user_id and author_id in subscribed)
+        return authors
+
+    def get_field_builders(self, rows):
+        fields = self.fields
+        recipe_ids = [row['id'] for row in rows]
+        builders = {}
+        if 'tags' in fields or 'ingredients' in fields:
+            reference = get_reference_data()
+        if 'tags' in fields:
+            tags = self.get_tags(recipe_ids, reference)
+            builders['tags'] = lambda row: tags[row['id']]
+        if 'author' in fields:
+            authors = self.get_authors({row['author_id'] for row in rows})
+            builders['author'] = lambda row: dict(authors[row['author_id']])
+        if 'ingredients' in fields:
+            ingredients = self.get_ingredients(recipe_ids, reference)
+            builders['ingredients'] = lambda row: ingredients[row['id']]
+        if 'is_favorited' in fields:
+            favorited = get_memberships(self.request, Favorite)
+            builders['is_favorited'] = lambda row: row['id'] in favorited
+        if 'is_in_shopping_cart' in fields:
+            in_cart = get_memberships(self.request, ShoppingCart)
+            builders['is_in_shopping_cart'] = lambda row: row['id'] in in_cart
+        builders['image'] = lambda row: self.build_image_url(row['image'])
+        return builders
+
+
+class FastSubscriptionListSerializer(FastReadSerializer):
+    """ Быстрый аналог SubscriptionListSerializer(many=True). """
+
+    field_names = USER_FIELDS + ('is_subscribed', 'recipes', 'recipes_count')
+    field_columns = {name: (name,) for name in USER_FIELDS}
+
+    def get_limited_recipe_rows(self, queryset, recipes_limit):
+        """
+        Не больше recipes_limit последних рецептов каждого автора. Django 3.2
+        не фильтрует по оконным функциям, поэтому отбор по номеру строки
+        выполняется во внешнем запросе.
+        """
+
+        queryset = queryset.annotate(recipe_position=Window(
+            RowNumber(), partition_by=[F('author_id')],
+            order_by=[OrderBy(F(name.lstrip('-')),
+                              descending=name.startswith('-'))
+                      for name in Recipe._meta.ordering]))
+        sql, params = queryset.query.sql_with_params()
+        connection = connections[queryset.db]
+        columns = ', '.join(
+            connection.ops.quote_name(column) for column in RECIPE_COLUMNS)
+        position = connection.ops.quote_name('recipe_position')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {columns} FROM ({sql}) ranked '
+                f'WHERE {position} <= %s ORDER BY {position}',
+                (*params, recipes_limit))
+            for row in cursor.fetchall():
+                yield dict(zip(RECIPE_COLUMNS, row))
+
+    def get_recipes(self, author_ids, recipes_limit=None):
+        queryset = Recipe.objects.filter(
+            author_id__in=author_ids).values(*RECIPE_COLUMNS)
+        rows = queryset
+        if recipes_limit is not None:
+            rows = self.get_limited_recipe_rows(queryset, recipes_limit)
+        recipes = defaultdict(list)
+        for row in rows:
+            recipes[row.pop('author_id')].append(row)
+        return recipes
+
+    def get_recipes_count(self, author_ids):
+        return dict(Recipe.objects.filter(
+            author_id__in=author_ids
+        ).order_by().values('author_id').annotate(
+            count=Count('id')).values_list('author_id', 'count'))
+
+    def get_recipe_list(self, recipes):
+        return [
+            {
+                'id': recipe['id'],
+                'name': recipe['name'],
+                'image': self.build_image_url(recipe['image']),
+                'cooking_time': recipe['cooking_time'],
+            }
+            for recipe in recipes
+        ]
+
+    def add_recipe_builders(self, builders, author_ids):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is not None:
+            recipes_limit = int(recipes_limit)
+        recipes = self.get_recipes(author_ids, recipes_limit)
+        builders['recipes'] = lambda row: self.get_recipe_list(
+            recipes[row['id']])
+        if recipes_limit is None:
+            builders['recipes_count'] = lambda row: len(recipes[row['id']])
+
+    def get_field_builders(self, rows):
+        fields = self.fields
+        user = self.user
+        author_ids = [row['id'] for row in rows]
+        builders = {}
+        if user is None or not user.is_authenticated:
+            builders['is_subscribed'] = builders['recipes'] = (
+                lambda row: None)
+        elif 'is_subscribed' in fields:
+            subscribed = self.get_subscribed_ids()
+            builders['is_subscribed'] = lambda row: row['id'] in subscribed
+        if 'recipes' in fields and 'recipes' not in builders:
+            self.add_recipe_builders(builders, author_ids)
+        if 'recipes_count' in fields and 'recipes_count' not in builders:
+            recipes_count = self.get_recipes_count(author_ids)
+            builders['recipes_count'] = (
+                lambda row: recipes_count.get(row['id'], 0))
+        return builders
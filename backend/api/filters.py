@@ -21,12 +21,28 @@ class RecipeFilter(django_filters.FilterSet):
         queryset=Tag.objects.all(),
     )
     is_favorited = django_filters.BooleanFilter(
+        method='filter_user_relation', field_name='favorite__user',
         widget=django_filters.widgets.BooleanWidget()
     )
     is_in_shopping_cart = django_filters.BooleanFilter(
+        method='filter_user_relation', field_name='shopping_cart__user',
         widget=django_filters.widgets.BooleanWidget()
     )
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',)
+
+    def filter_user_relation(self, queryset, name, value):
+        """
+        Рецепты из избранного или списка покупок пользователя: соединение
+        по индексу (user, recipe) вместо проверки подзапроса для каждого
+        рецепта.
+        """
+
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none() if value else queryset
+        if value:
+            return queryset.filter(**{name: user})
+        return queryset.exclude(**{name: user})
@@ -0,0 +1,182 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils.encoding import iri_to_uri
+from rest_framework.authtoken.models import Token
+
+from recipes.management.commands.generate_data import USERNAME_PREFIX
+from recipes.models import Recipe
+from users.models import User
+
+DEFAULT_ENDPOINTS = (
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=к',
+    '/api/recipes/',
+    '/api/recipes/?page=10',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?tags=breakfast&tags=dinner',
+    '/api/recipes/{recipe_id}/',
+    '/api/users/',
+    '/api/users/subscriptions/?recipes_limit=3',
+    '/api/recipes/download_shopping_cart/',
+)
+NO_DATA_MSG = (
+    'Нет синтетических пользователей и рецептов: '
+    'сначала выполните generate_data.'
+)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class WSGIClient:
+    """
+    Вызывает WSGI-приложение напрямую, как это делает gunicorn: в отличие
+    от тестового клиента, соединения с БД закрываются по CONN_MAX_AGE.
+    """
+
+    def __init__(self, **headers):
+        self.application = get_wsgi_application()
+        self.headers = headers
+
+    def get(self, url):
+        path, _, query = iri_to_uri(url).partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'testserver',
+            **self.headers,
+        }
+        setup_testing_defaults(environ)
+        status = []
+        chunks = self.application(
+            environ, lambda code, headers: status.append(code))
+        try:
+            size = sum(len(chunk) for chunk in chunks)
+        finally:
+            chunks.close()
+        return int(status[0].split()[0]), size
+
+
+class Command(BaseCommand):
+    help = 'Замер латентности и числа запросов к БД для эндпоинтов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Число замеряемых запросов на эндпоинт')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--anonymous', action='store_true',
+                            help='Выполнять запросы без авторизации')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Эндпоинт для замера (можно повторять)')
+        parser.add_argument('--wsgi', action='store_true',
+                            help='Выполнять запросы через WSGI-приложение')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Число параллельных потоков')
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результаты в формате JSON')
+        parser.add_argument('--accept-encoding', default='',
+                            help='Заголовок Accept-Encoding, например gzip')
+
+    def get_client(self, anonymous, wsgi, accept_encoding):
+        client_class = WSGIClient if wsgi else Client
+        headers = {}
+        if accept_encoding:
+            headers['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        if anonymous:
+            return client_class(**headers)
+        user = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by('id').first()
+        if user is None:
+            raise CommandError(NO_DATA_MSG)
+        token, _ = Token.objects.get_or_create(user=user)
+        return client_class(HTTP_AUTHORIZATION=f'Token {token.key}',
+                            **headers)
+
+    def timed_fetch(self, client, url):
+        started = time.perf_counter()
+        status_code, size = self.fetch(client, url)
+        return status_code, size, time.perf_counter() - started
+
+    def measure(self, client, url, requests, warmup, concurrency):
+        for _ in range(warmup):
+            self.fetch(client, url)
+        queries = []
+        started = time.perf_counter()
+        if concurrency > 1:
+            # Запросы к БД считаются только в однопоточном режиме:
+            # у каждого потока своё соединение.
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = list(executor.map(
+                    lambda _: self.timed_fetch(client, url), range(requests)))
+        else:
+            results = []
+            for _ in range(requests):
+                with CaptureQueriesContext(connection) as context:
+                    results.append(self.timed_fetch(client, url))
+                queries.append(len(context.captured_queries))
+        elapsed = time.perf_counter() - started
+        status_code, size, _ = results[-1] if results else (None, 0, 0)
+        latencies = [latency for _, _, latency in results] or [0.0]
+        return {
+            'url': url,
+            'status': status_code,
+            'bytes': size,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'queries': statistics.mean(queries) if queries else None,
+            'rps': requests / elapsed if elapsed else 0.0,
+        }
+
+    def fetch(self, client, url):
+        if isinstance(client, WSGIClient):
+            return client.get(url)
+        response = client.get(url)
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        return response.status_code, len(content)
+
+    def handle(self, *args, **options):
+        recipe = Recipe.objects.order_by('id').first()
+        if recipe is None:
+            raise CommandError(NO_DATA_MSG)
+        client = self.get_client(options['anonymous'], options['wsgi'],
+                                 options['accept_encoding'])
+        endpoints = options['endpoints'] or DEFAULT_ENDPOINTS
+        results = [
+            self.measure(
+                client, endpoint.format(recipe_id=recipe.id),
+                options['requests'], options['warmup'],
+                options['concurrency'])
+            for endpoint in endpoints
+        ]
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False))
+            return
+        header = (f'{"эндпоинт":<45} {"код":>4} {"p50, мс":>9} '
+                  f'{"p95, мс":>9} {"запросов":>9} {"rps":>8} {"байт":>9}')
+        self.stdout.write(header)
+        for row in results:
+            queries = '-'
+            if row['queries'] is not None:
+                queries = f'{row["queries"]:.1f}'
+            self.stdout.write(
+                f'{row["url"]:<45} {row["status"]:>4} {row["p50_ms"]:>9.2f} '
+                f'{row["p95_ms"]:>9.2f} {queries:>9} '
+                f'{row["rps"]:>8.1f} {row["bytes"]:>9}'
+            )
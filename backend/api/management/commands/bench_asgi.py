@@ -0,0 +1,207 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_api import percentile
+
+WSGI = 'wsgi'
+ASGI = 'asgi'
+GUNICORN_RUN = 'from gunicorn.app.wsgiapp import run; run()'
+SERVER_ARGS = {
+    WSGI: ('foodgram.wsgi:application',),
+    ASGI: ('foodgram.asgi:application',
+           '-k', 'uvicorn.workers.UvicornWorker'),
+}
+REQUEST_TEMPLATE = (
+    'GET {url} HTTP/1.1\r\n'
+    'Host: {host}\r\n'
+    'Connection: close\r\n'
+    '{extra}'
+    '\r\n'
+)
+SLOW_PARTS = 20
+SERVER_START_TIMEOUT = 30
+REQUEST_TIMEOUT = 60
+NO_UVICORN_MSG = 'Для режима asgi нужен пакет uvicorn (requirements.txt).'
+SERVER_FAILED_MSG = 'Сервер {mode} не запустился:\n{log}'
+RESULT_MSG = (
+    '{mode}: быстрых запросов {count} ({rps:.1f}/с), p50 {p50:.0f} мс, '
+    'p95 {p95:.0f} мс, p99 {p99:.0f} мс, ошибок {errors}; '
+    'медленных клиентов обслужено {slow_done} из {slow_total}'
+)
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def send_request(port, parts, delay=0):
+    """
+    HTTP-запрос частями с паузой delay между ними. Возвращает код
+    ответа, прочитав ответ до закрытия соединения.
+    """
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for index, part in enumerate(parts):
+            if index and delay:
+                await asyncio.sleep(delay)
+            writer.write(part)
+            await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1]) if response else None
+
+
+async def timed_request(port, request):
+    started = time.perf_counter()
+    try:
+        status = await asyncio.wait_for(
+            send_request(port, [request]), REQUEST_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        status = None
+    return status, time.perf_counter() - started
+
+
+async def fast_client(port, request, deadline, results):
+    while time.perf_counter() < deadline:
+        results.append(await timed_request(port, request))
+
+
+async def slow_client(port, parts, delay):
+    """ Клиент на медленном канале: заголовки приходят частями. """
+
+    try:
+        status = await asyncio.wait_for(
+            send_request(port, parts, delay), REQUEST_TIMEOUT)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    return status is not None and status < 500
+
+
+def split_request(request, parts):
+    size = -(-len(request) // parts)
+    return [
+        request[start:start + size]
+        for start in range(0, len(request), size)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение gunicorn с синхронными воркерами (WSGI) и с воркерами '
+        'uvicorn (ASGI) при множестве медленных клиентов: латентность '
+        'обычных запросов, пока медленные клиенты передают свои запросы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', action='append', dest='modes',
+                            choices=(WSGI, ASGI),
+                            help='Режим сервера (можно повторять)')
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Число процессов gunicorn')
+        parser.add_argument('--slow-clients', type=int, default=50)
+        parser.add_argument(
+            '--slow-time', type=float, default=10,
+            help='За сколько секунд медленный клиент передаёт запрос; '
+                 'меньше таймаута воркеров gunicorn (30 с)')
+        parser.add_argument('--fast-clients', type=int, default=10,
+                            help='Число параллельных обычных клиентов')
+        parser.add_argument('--url', default='/api/recipes/',
+                            help='Адрес запросов обычных и медленных клиентов')
+
+    def start_server(self, mode, port, workers, log):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'foodgram.settings'}
+        return subprocess.Popen(
+            [sys.executable, '-c', GUNICORN_RUN, *SERVER_ARGS[mode],
+             '--workers', str(workers), '--bind', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL,
+            stderr=log)
+
+    async def wait_ready(self, port, request):
+        deadline = time.perf_counter() + SERVER_START_TIMEOUT
+        while time.perf_counter() < deadline:
+            status, _ = await timed_request(port, request)
+            if status is not None:
+                return True
+            await asyncio.sleep(0.2)
+        return False
+
+    async def run_load(self, port, options):
+        host = f'127.0.0.1:{port}'
+        request = REQUEST_TEMPLATE.format(
+            url=options['url'], host=host, extra='').encode()
+        if not await self.wait_ready(port, request):
+            return None
+        # Заголовок-заполнитель делает запрос медленного клиента похожим
+        # на загрузку: он передаётся SLOW_PARTS частями за --slow-time.
+        slow_request = REQUEST_TEMPLATE.format(
+            url=options['url'], host=host,
+            extra=f'X-Padding: {"x" * 1024}\r\n').encode()
+        parts = split_request(slow_request, SLOW_PARTS)
+        delay = options['slow_time'] / (len(parts) - 1)
+        slow = [
+            asyncio.ensure_future(slow_client(port, parts, delay))
+            for _ in range(options['slow_clients'])
+        ]
+        # Обычные клиенты начинают после того, как медленные подключились.
+        await asyncio.sleep(0.5)
+        results = []
+        started = time.perf_counter()
+        deadline = started + options['slow_time']
+        await asyncio.gather(*(
+            fast_client(port, request, deadline, results)
+            for _ in range(options['fast_clients'])
+        ))
+        elapsed = time.perf_counter() - started
+        slow_done = sum(await asyncio.gather(*slow))
+        return results, elapsed, slow_done
+
+    def measure(self, mode, options):
+        port = get_free_port()
+        with tempfile.TemporaryFile('w+') as log:
+            server = self.start_server(mode, port, options['workers'], log)
+            try:
+                load = asyncio.run(self.run_load(port, options))
+            finally:
+                server.terminate()
+                server.wait()
+            if load is None:
+                log.seek(0)
+                raise CommandError(
+                    SERVER_FAILED_MSG.format(mode=mode, log=log.read()))
+        results, elapsed, slow_done = load
+        latencies = [
+            latency * 1000 for status, latency in results
+            if status is not None and status < 500
+        ] or [0.0]
+        return RESULT_MSG.format(
+            mode=mode,
+            count=len(results),
+            rps=len(results) / elapsed,
+            p50=percentile(latencies, 0.5),
+            p95=percentile(latencies, 0.95),
+            p99=percentile(latencies, 0.99),
+            errors=sum(
+                status is None or status >= 500 for status, _ in results),
+            slow_done=slow_done,
+            slow_total=options['slow_clients'],
+        )
+
+    def handle(self, *args, **options):
+        modes = options['modes'] or (WSGI, ASGI)
+        if ASGI in modes and importlib.util.find_spec('uvicorn') is None:
+            raise CommandError(NO_UVICORN_MSG)
+        for mode in modes:
+            self.stdout.write(self.measure(mode, options))
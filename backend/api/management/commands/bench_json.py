@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.fast_serializers import FastRecipeListSerializer
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import IngredientSerializer
+from recipes.models import Ingredient, Recipe
+
+MISMATCH_MSG = 'Вывод FastJSONRenderer для {name} отличается от JSONRenderer.'
+
+
+class Command(BaseCommand):
+    help = 'Сравнение скорости JSONRenderer и FastJSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=100,
+                            help='Число рецептов в замеряемой странице')
+
+    def measure(self, renderer, data, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            renderer.render(data)
+        return (time.perf_counter() - started) / repeat * 1000
+
+    def serialize_recipes(self, page_size):
+        serializer = FastRecipeListSerializer()
+        serializer.instance = Recipe.objects.values(
+            *serializer.row_fields)[:page_size]
+        return serializer.data
+
+    def handle(self, *args, **options):
+        payloads = {
+            'ingredients': IngredientSerializer(
+                Ingredient.objects.all(), many=True).data,
+            'recipes': self.serialize_recipes(options['page_size']),
+        }
+        if orjson is None:
+            self.stdout.write(
+                'orjson не установлен, FastJSONRenderer использует json.')
+        slow_renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+        for name, data in payloads.items():
+            encoded = slow_renderer.render(data)
+            if fast_renderer.render(data) != encoded:
+                raise CommandError(MISMATCH_MSG.format(name=name))
+            slow = self.measure(slow_renderer, data, options['repeat'])
+            fast = self.measure(fast_renderer, data, options['repeat'])
+            self.stdout.write(
+                f'{name} ({len(encoded)} байт): json {slow:.2f} мс, '
+                f'orjson {fast:.2f} мс, ускорение x{slow / fast:.1f}'
+            )
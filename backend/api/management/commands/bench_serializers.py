@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import (FastRecipeListSerializer,
+                                  FastSubscriptionListSerializer)
+from api.serializers import RecipeListSerializer, SubscriptionListSerializer
+from recipes.management.commands.generate_data import USERNAME_PREFIX
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер скорости DRF-сериализаторов списков и быстрых; '
+        'идентичность JSON проверяется в api.tests'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=6,
+                            help='Число объектов в сериализуемой странице')
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--recipes-limit', type=int, default=3)
+        parser.add_argument('--fields', default='',
+                            help='Значение параметра ?fields=')
+        parser.add_argument('--omit', default='',
+                            help='Значение параметра ?omit=')
+
+    def get_request(self, user, options):
+        request = Request(APIRequestFactory().get('/api/', {
+            'recipes_limit': options['recipes_limit'],
+            'fields': options['fields'],
+            'omit': options['omit'],
+        }))
+        request.user = user
+        return request
+
+    def fast_serialize(self, serializer_class, queryset, context):
+        serializer = serializer_class(context=context)
+        serializer.instance = queryset.values(*serializer.row_fields)
+        return serializer.data
+
+    def compare(self, name, slow, fast, repeat):
+        renderer = JSONRenderer()
+        timings = []
+        for serialize in (slow, fast):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                renderer.render(serialize())
+            timings.append((time.perf_counter() - started) / repeat * 1000)
+        self.stdout.write(
+            f'{name}: DRF {timings[0]:.2f} мс, быстрый {timings[1]:.2f} мс, '
+            f'ускорение x{timings[0] / timings[1]:.1f}'
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).order_by('id').first()
+        if user is None:
+            raise CommandError('Сначала выполните generate_data.')
+        context = {
+            'request': self.get_request(user, options)
+        }
+        size = options['size']
+        recipes = Recipe.objects.all()[:size]
+        self.compare(
+            'RecipeListSerializer',
+            lambda: RecipeListSerializer(
+                recipes, many=True, context=context).data,
+            lambda: self.fast_serialize(
+                FastRecipeListSerializer, recipes, context),
+            options['repeat'],
+        )
+        authors = User.objects.filter(recipes__isnull=False).distinct()
+        authors = authors.order_by('id')[:size]
+        self.compare(
+            'SubscriptionListSerializer',
+            lambda: SubscriptionListSerializer(
+                authors, many=True, context=context).data,
+            lambda: self.fast_serialize(
+                FastSubscriptionListSerializer, authors, context),
+            options['repeat'],
+        )
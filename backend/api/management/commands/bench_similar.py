@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+from recipes.similarity import find_similar, get_features, jaccard
+
+from .bench_api import percentile
+
+NO_DATA_MSG = 'Нет рецептов: сначала выполните generate_data.'
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер скорости и полноты поиска похожих рецептов по LSH-индексу '
+        'в сравнении с полным перебором'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=100,
+                            help='Число рецептов, для которых ищутся похожие')
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Перестроить индекс с замером времени')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            started = time.perf_counter()
+            call_command('build_similarity_index', stdout=self.stdout)
+            self.stdout.write(
+                f'Построение индекса: {time.perf_counter() - started:.1f} с')
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        if not recipe_ids:
+            raise CommandError(NO_DATA_MSG)
+        features = get_features(recipe_ids)
+        limit = options['limit']
+        sample = random.Random(options['seed']).sample(
+            recipe_ids, min(options['queries'], len(recipe_ids)))
+
+        lsh_timings = []
+        brute_timings = []
+        recalls = []
+        for recipe_id in sample:
+            started = time.perf_counter()
+            similar_ids = find_similar(recipe_id, limit)
+            lsh_timings.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            target = features[recipe_id]
+            exact = sorted(
+                (jaccard(target, other), other_id)
+                for other_id, other in features.items()
+                if other_id != recipe_id
+            )[-limit:]
+            brute_timings.append((time.perf_counter() - started) * 1000)
+
+            threshold = exact[0][0] if len(exact) == limit else 0
+            if threshold > 0:
+                found = sum(
+                    jaccard(target, features[similar_id]) >= threshold
+                    for similar_id in similar_ids
+                )
+                recalls.append(found / limit)
+
+        self.stdout.write(f'Рецептов: {len(recipe_ids)}, запросов: '
+                          f'{len(sample)}, top-{limit}')
+        for name, timings in (('LSH', lsh_timings),
+                              ('перебор в памяти', brute_timings)):
+            self.stdout.write(
+                f'{name}: p50 {percentile(timings, 0.5):.2f} мс, '
+                f'p95 {percentile(timings, 0.95):.2f} мс'
+            )
+        if recalls:
+            self.stdout.write(
+                f'Полнота top-{limit}: {sum(recalls) / len(recalls):.2f}')
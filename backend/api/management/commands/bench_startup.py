@@ -0,0 +1,71 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_api import percentile
+
+# Выполняется в отдельном процессе: холодная загрузка WSGI-приложения и
+# URLconf, как при старте процесса gunicorn. ru_maxrss в Linux - в КБ.
+STARTUP_SCRIPT = '''
+import importlib
+import json
+import resource
+import sys
+import time
+
+started = time.perf_counter()
+for module in {preload!r}:
+    importlib.import_module(module)
+from foodgram.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': sorted(
+        module for module in {watched!r} if module in sys.modules),
+}}))
+'''
+WATCHED_MODULES = ('reportlab', 'PIL', 'coreapi', 'brotli', 'orjson')
+FAILURE_MSG = 'Процесс замера завершился с ошибкой:\n{stderr}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Время холодного импорта foodgram.wsgi с загрузкой URLconf и '
+        'максимальный RSS процесса'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument(
+            '--preload', action='append', default=[],
+            help='Модуль, импортируемый до приложения; например, '
+                 '--preload reportlab.pdfgen.canvas воспроизводит '
+                 'импорт ReportLab при загрузке api.views')
+
+    def run_once(self, preload):
+        process = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT.format(
+                preload=tuple(preload), watched=WATCHED_MODULES)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(FAILURE_MSG.format(stderr=process.stderr))
+        return json.loads(process.stdout.splitlines()[-1])
+
+    def handle(self, *args, **options):
+        results = [
+            self.run_once(options['preload']) for _ in range(options['runs'])
+        ]
+        timings = [result['seconds'] * 1000 for result in results]
+        rss = [result['rss_kb'] / 1024 for result in results]
+        self.stdout.write(
+            f'Импорт: p50 {percentile(timings, 0.5):.0f} мс, '
+            f'p95 {percentile(timings, 0.95):.0f} мс; '
+            f'RSS: p50 {percentile(rss, 0.5):.1f} МБ\n'
+            f'Загружены: {", ".join(results[-1]["modules"]) or "-"}'
+        )
@@ -0,0 +1,155 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from recipes.management.commands.generate_data import USERNAME_PREFIX
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+# Эндпоинты и вендоры БД, на которых для их запросов ожидаются индексы.
+CHECKED_ENDPOINTS = (
+    ('/api/recipes/', None),
+    ('/api/recipes/?page=50', None),
+    ('/api/recipes/?author={author_id}', None),
+    ('/api/recipes/?tags={tag_slug}', None),
+    ('/api/recipes/?is_favorited=1', None),
+    ('/api/recipes/?is_in_shopping_cart=1', None),
+    ('/api/recipes/{recipe_id}/', None),
+    ('/api/users/subscriptions/?recipes_limit=3', None),
+    ('/api/recipes/download_shopping_cart/', None),
+    # В SQLite LIKE с ESCAPE, который строит Django, не использует индексы.
+    ('/api/ingredients/?name={ingredient_prefix}', ('postgresql',)),
+)
+# Общее число строк таблицы без условий требует её полного чтения.
+FULL_COUNT_RE = re.compile(
+    r'^SELECT COUNT\(\*\) AS "__count" FROM "\w+"$')
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$')
+NO_DATA_MSG = (
+    'Нет синтетических пользователей с избранным, списком покупок и '
+    'подписками: сначала выполните generate_data.'
+)
+FAILURE_MSG = 'Полное сканирование таблиц в {count} запросах.'
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка планов запросов API через EXPLAIN: ошибка, если запрос '
+        'к заполненной таблице выполняется полным сканированием'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Таблицы меньшего размера планировщик вправе сканировать')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Выводить планы всех запросов')
+
+    def get_client(self):
+        user = User.objects.filter(
+            username__startswith=USERNAME_PREFIX,
+            favorite__isnull=False,
+            shopping_cart__isnull=False,
+            follower__isnull=False,
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError(NO_DATA_MSG)
+        token, _ = Token.objects.get_or_create(user=user)
+        return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def get_url_params(self):
+        recipe = Recipe.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        if recipe is None or ingredient is None or tag is None:
+            raise CommandError(NO_DATA_MSG)
+        return {
+            'recipe_id': recipe.id,
+            'author_id': recipe.author_id,
+            'tag_slug': tag.slug,
+            'ingredient_prefix': ingredient.name[:2],
+        }
+
+    def get_table_sizes(self):
+        sizes = {}
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                sizes[table] = cursor.fetchone()[0]
+        return sizes
+
+    def explain(self, sql):
+        """ Таблицы, которые план запроса читает полным сканированием. """
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return plan, list(self.find_seq_scans(plan[0]['Plan']))
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+        return plan, [
+            match.group(1)
+            for match in map(SQLITE_SCAN_RE.match, plan) if match
+        ]
+
+    def find_seq_scans(self, node):
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', ()):
+            yield from self.find_seq_scans(child)
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def check_endpoint(self, client, url, table_sizes, options):
+        # Первый запрос прогревает кеши процесса (снимок справочников,
+        # множества избранного), проверяются запросы установившегося режима.
+        self.fetch(client, url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.fetch(client, url)
+        failures = 0
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or FULL_COUNT_RE.match(sql):
+                continue
+            plan, scanned = self.explain(sql)
+            scanned = [table for table in scanned
+                       if table_sizes.get(table, 0) >= options['min_rows']]
+            if options['verbose_plans']:
+                self.stdout.write(f'{sql}\n{plan}')
+            if scanned:
+                failures += 1
+                self.stdout.write(self.style.ERROR(
+                    f'{url}: полное сканирование {", ".join(scanned)}\n'
+                    f'  {sql}\n  {plan}'))
+        if not failures:
+            self.stdout.write(self.style.SUCCESS(
+                f'{url}: {response.status_code}, '
+                f'{len(context.captured_queries)} запросов, OK'))
+        return failures
+
+    def handle(self, *args, **options):
+        client = self.get_client()
+        params = self.get_url_params()
+        table_sizes = self.get_table_sizes()
+        failures = 0
+        for url, vendors in CHECKED_ENDPOINTS:
+            url = url.format(**params)
+            if vendors is not None and connection.vendor not in vendors:
+                self.stdout.write(f'{url}: пропущен для {connection.vendor}')
+                continue
+            failures += self.check_endpoint(
+                client, url, table_sizes, options)
+        if failures:
+            raise CommandError(FAILURE_MSG.format(count=failures))
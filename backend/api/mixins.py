@@ -0,0 +1,98 @@
+from django.conf import settings
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+from foodgram.compression import PRECOMPRESSED_ATTR
+from foodgram.db.routers import read_from_primary
+from recipes.versioning import get_data_version
+
+from .renderers import EncodedJSON, FastJSONRenderer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+_encoded_responses = {}
+
+
+def parse_field_names(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+def get_sparse_field_names(request, field_names):
+    """
+    Поля ответа с учётом параметров ?fields= (оставить только перечисленные)
+    и ?omit= (исключить перечисленные) в исходном порядке.
+    """
+
+    if request is None:
+        return tuple(field_names)
+    requested = parse_field_names(request.query_params.get(FIELDS_PARAM))
+    omitted = parse_field_names(request.query_params.get(OMIT_PARAM))
+    return tuple(
+        name for name in field_names
+        if (not requested or name in requested) and name not in omitted
+    )
+
+
+class EncodedReferenceListMixin:
+    """
+    Кеширует закодированный JSON нефильтрованного списка справочных данных
+    (тэги, ингредиенты) в памяти процесса до смены версии данных модели,
+    общей для всех процессов (см. recipes.versioning).
+    Сжатые варианты тела хранятся вместе с ним (см. CompressionMiddleware).
+    """
+
+    def list(self, request, *args, **kwargs):
+        if (not settings.CACHE_REFERENCE_RESPONSES
+                or request.query_params
+                or not isinstance(request.accepted_renderer,
+                                  FastJSONRenderer)):
+            return super().list(request, *args, **kwargs)
+        name = type(self).__name__
+        key = (
+            name,
+            request.accepted_media_type,
+            get_data_version(self.get_queryset().model),
+        )
+        encoded = _encoded_responses.get(key)
+        if encoded is None:
+            # Ответ сохраняется под версией данных, поэтому читается с
+            # основной БД, а не с возможно отстающей реплики.
+            with read_from_primary():
+                response = super().list(request, *args, **kwargs)
+            encoded = EncodedJSON(request.accepted_renderer.render(
+                response.data, request.accepted_media_type,
+                self.get_renderer_context()
+            ))
+            for stale_key in [item for item in _encoded_responses
+                              if item[0] == name and item[2] != key[2]]:
+                _encoded_responses.pop(stale_key, None)
+            setattr(encoded, PRECOMPRESSED_ATTR, {})
+            _encoded_responses[key] = encoded
+        response = Response(encoded)
+        setattr(response, PRECOMPRESSED_ATTR,
+                getattr(encoded, PRECOMPRESSED_ATTR))
+        return response
+
+
+class SparseFieldsetMixin:
+    """
+    Поддержка ?fields= и ?omit= для сериализатора верхнего уровня.
+    Неотобранные поля не вычисляются, поэтому их запросы к БД не выполняются.
+    """
+
+    def is_sparse_fieldset_root(self):
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_sparse_fieldset_root():
+            return fields
+        names = get_sparse_field_names(self.context.get('request'), fields)
+        for name in list(fields):
+            if name not in names:
+                del fields[name]
+        return fields
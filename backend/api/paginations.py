@@ -4,3 +4,36 @@ from rest_framework import pagination
 class CustomPageNumberPagination(pagination.PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class CustomCursorPagination(pagination.CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = 'id'
+
+
+class PageNumberOrCursorPagination(CustomPageNumberPagination):
+    """
+    Навигация по номеру страницы, как описано в документации API, или,
+    если передан параметр ?cursor= (в том числе пустой), keyset-навигация
+    по id без COUNT и OFFSET.
+    """
+
+    cursor_pagination_class = CustomCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_pagination = self.cursor_pagination_class()
+        if cursor_pagination.cursor_query_param in request.query_params:
+            self.cursor_paginator = cursor_pagination
+            return cursor_pagination.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(
+            queryset.order_by(cursor_pagination.ordering), request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,70 @@
+import os
+from io import BytesIO
+
+# ReportLab (вместе с Pillow) импортируется при первом рендеринге, а не
+# при загрузке модуля: иначе его импорт оплачивают каждый процесс сервера
+# и каждая команда manage.py.
+FONT_NAME = 'FreeSans'
+FONT_FILE = 'FreeSans.ttf'
+
+
+def register_font(font_dir):
+    from reportlab import rl_config
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return
+    if font_dir not in rl_config.TTFSearchPath:
+        rl_config.TTFSearchPath.append(font_dir)
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE))
+
+
+def render_shopping_cart(items, font_dir):
+    """
+    PDF списка покупок. items - кортежи (название, количество, единица
+    измерения). Функция не обращается к Django и выполняется в процессах
+    пула рендеринга.
+    """
+
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    register_font(font_dir)
+    buffer = BytesIO()
+    pdf_obj = canvas.Canvas(buffer, pagesize=A4)
+    pdf_obj.setFont(FONT_NAME, 20)
+    pdf_title = 'Список покупок'
+    title_x_coord = 260
+    title_y_coord = 800
+    x_coord = 50
+    y_coord = 780
+    if items:
+        pdf_obj.drawCentredString(title_x_coord, title_y_coord, pdf_title)
+        for name, total_amount, measurement_unit in items:
+            pdf_obj.setFontSize(14)
+            pdf_obj.drawString(
+                x_coord, y_coord,
+                f'{name} - {total_amount} {measurement_unit}'
+            )
+            y_coord -= 15
+            if y_coord < 30:
+                pdf_obj.showPage()
+                y_coord = 800
+    else:
+        pdf_obj.drawCentredString(
+            title_x_coord,
+            title_y_coord,
+            'Список покупок пуст.')
+    pdf_obj.showPage()
+    pdf_obj.save()
+    return buffer.getvalue()
+
+
+def render_shopping_cart_file(items, font_dir, path):
+    """ Запись PDF в файл: сначала во временный, затем переименованием. """
+
+    partial_path = f'{path}.part'
+    with open(partial_path, 'wb') as file:
+        file.write(render_shopping_cart(items, font_dir))
+    os.replace(partial_path, path)
@@ -0,0 +1,171 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from .pdf import render_shopping_cart, render_shopping_cart_file
+
+JOB_PENDING = 'pending'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FONT_DIR = os.path.join(settings.BASE_DIR, 'data')
+
+_executor = None
+_executor_pid = None
+_slots = None
+_lock = threading.Lock()
+
+
+class RenderPoolBusyError(Exception):
+    """ Все места в очереди рендеринга заняты. """
+
+
+def get_executor():
+    """
+    Пул процессов рендеринга текущего процесса. Процессы запускаются
+    через spawn: форк процесса с потоками и открытыми соединениями с БД
+    небезопасен.
+    """
+
+    global _executor, _executor_pid, _slots
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'))
+            _executor_pid = os.getpid()
+            _slots = threading.BoundedSemaphore(
+                settings.PDF_RENDER_QUEUE_SIZE)
+        return _executor, _slots
+
+
+def discard_executor(executor):
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def submit(function, *args):
+    """
+    Отправка задачи в пул без ожидания места: если выполняются или ждут
+    PDF_RENDER_QUEUE_SIZE задач, вызывается RenderPoolBusyError.
+    """
+
+    executor, slots = get_executor()
+    if not slots.acquire(blocking=False):
+        raise RenderPoolBusyError
+    try:
+        future = executor.submit(function, *args)
+    except BrokenProcessPool:
+        slots.release()
+        discard_executor(executor)
+        raise RenderPoolBusyError
+    future.add_done_callback(lambda future: slots.release())
+    return future
+
+
+def render(items):
+    """ PDF списка покупок; вызывающий поток ждёт окончания рендеринга. """
+
+    if not settings.PDF_RENDER_WORKERS:
+        return render_shopping_cart(items, FONT_DIR)
+    executor, _ = get_executor()
+    try:
+        return submit(render_shopping_cart, items, FONT_DIR).result()
+    except BrokenProcessPool:
+        discard_executor(executor)
+        raise RenderPoolBusyError
+
+
+def get_job_path(job_id):
+    return os.path.join(settings.PDF_JOBS_DIR, f'{job_id}.pdf')
+
+
+def get_job_info_path(job_id):
+    return os.path.join(settings.PDF_JOBS_DIR, f'{job_id}.json')
+
+
+def write_job(job_id, job):
+    """ Запись состояния задачи: сначала во временный файл. """
+
+    path = get_job_info_path(job_id)
+    partial_path = f'{path}.part'
+    with open(partial_path, 'w') as file:
+        json.dump(job, file)
+    os.replace(partial_path, path)
+
+
+def remove_job(job_id):
+    for path in (get_job_info_path(job_id), get_job_path(job_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_expired_jobs():
+    expired = time.time() - settings.PDF_JOB_TTL
+    with os.scandir(settings.PDF_JOBS_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < expired:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def start_job(user_id, items):
+    """
+    Фоновый рендеринг в файл каталога PDF_JOBS_DIR. Рядом в JSON-файле
+    хранятся владелец и статус задачи, поэтому его видят все процессы
+    сервера с общим каталогом; готова задача, когда появился PDF.
+    """
+
+    os.makedirs(settings.PDF_JOBS_DIR, exist_ok=True)
+    remove_expired_jobs()
+    job_id = uuid.uuid4().hex
+    job = {'user_id': user_id, 'status': JOB_PENDING}
+    write_job(job_id, job)
+
+    def finish(future):
+        if future.cancelled() or future.exception() is not None:
+            write_job(job_id, {**job, 'status': JOB_FAILED})
+
+    if not settings.PDF_RENDER_WORKERS:
+        try:
+            render_shopping_cart_file(items, FONT_DIR, get_job_path(job_id))
+        except Exception:
+            remove_job(job_id)
+            raise
+    else:
+        try:
+            future = submit(render_shopping_cart_file, items, FONT_DIR,
+                            get_job_path(job_id))
+        except RenderPoolBusyError:
+            remove_job(job_id)
+            raise
+        future.add_done_callback(finish)
+    return job_id
+
+
+def get_job_status(job_id, user_id):
+    """ Статус задачи пользователя или None, если задачи нет. """
+
+    try:
+        with open(get_job_info_path(job_id)) as file:
+            job = json.load(file)
+    except FileNotFoundError:
+        return None
+    if job['user_id'] != user_id:
+        return None
+    if job['status'] == JOB_PENDING and os.path.exists(get_job_path(job_id)):
+        return JOB_DONE
+    return job['status']
@@ -4,5 +4,5 @@ from rest_framework import permissions
 class IsAdminOrAuthorOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in permissions.SAFE_METHODS
-                or obj.author == request.user
+                or obj.author_id == request.user.id
                 or request.user.is_superuser)
@@ -0,0 +1,50 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class EncodedJSON(bytes):
+    """ Уже закодированный JSON, который рендерер отдаёт без изменений. """
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на orjson с откатом на стандартный json из DRF.
+
+    Быстрый путь используется только для компактного вывода в UTF-8,
+    то есть для тех же настроек, что и у JSONRenderer по умолчанию,
+    поэтому результат совпадает побайтно.
+    """
+
+    default_encoder = JSONEncoder()
+
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.get_indent(
+                accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, EncodedJSON):
+            return bytes(data)
+        if data is None or not self.can_use_orjson(
+                accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.default_encoder.default,
+                option=(orjson.OPT_PASSTHROUGH_DATETIME
+                        | orjson.OPT_NON_STR_KEYS)
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
@@ -1,13 +1,21 @@
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.memberships import get_memberships
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.reference import get_reference_data
+from recipes.similarity import schedule_index_recipe
 from users.models import Subscription, User
 
+from .mixins import SparseFieldsetMixin
+
+BULK_RECIPES_MAX_LENGTH = 100
+
 
 class CustomUserCreateSerializer(UserCreateSerializer):
     class Meta:
@@ -15,7 +23,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         fields = ('email', 'password', 'username', 'first_name', 'last_name',)
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(SparseFieldsetMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -30,10 +38,15 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
+        # Списки и карточки пользователей аннотируют признак подзапросом.
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
+        request = self.context.get('request')
+        user = request.user
         if obj == user or user.is_anonymous:
             return False
-        return Subscription.objects.filter(author=obj, user=user).exists()
+        return obj.id in get_memberships(request, Subscription)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -48,15 +61,22 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit',)
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.IntegerField(source='ingredient.id')
-    name = serializers.CharField(source='ingredient.name')
-    measurement_unit = serializers.CharField(
-        source='ingredient.measurement_unit')
+class ReferenceTagField(serializers.PrimaryKeyRelatedField):
+    """
+    id тэга, проверяемый по справочнику в памяти; к БД запрос идёт, только
+    если тэга нет в снимке.
+    """
 
-    class Meta:
-        model = RecipeIngredient
-        fields = ('id', 'name', 'measurement_unit', 'amount',)
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if not get_reference_data().tag_exists(pk):
+            self.fail('does_not_exist', pk_value=data)
+        return pk
 
 
 class RecipeIngredientEditSerializer(serializers.ModelSerializer):
@@ -68,7 +88,8 @@ class RecipeIngredientEditSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount',)
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(SparseFieldsetMixin,
+                           serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     author = CustomUserSerializer()
     ingredients = serializers.SerializerMethodField()
@@ -84,16 +105,19 @@ class RecipeListSerializer(serializers.ModelSerializer):
         read_only_fields = ('is_favorited', 'is_in_shopping_cart',)
 
     def get_ingredients(self, obj):
-        queryset = RecipeIngredient.objects.filter(recipe=obj)
-        return RecipeIngredientSerializer(queryset, many=True).data
+        reference = get_reference_data()
+        return [
+            reference.ingredient_to_representation(ingredient_id, amount)
+            for ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe=obj).order_by('id').values_list(
+                    'ingredient_id', 'amount')
+        ]
 
     def __get_custom_model_field(self, obj, checked_model):
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
-        checked_queryset = checked_model.objects.filter(
-            user=request.user, recipe=obj.id).exists()
-        return checked_queryset
+        return obj.id in get_memberships(request, checked_model)
 
     def get_is_favorited(self, obj):
         return self.__get_custom_model_field(
@@ -105,7 +129,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = ReferenceTagField(
         queryset=Tag.objects.all(),
         many=True
     )
@@ -118,24 +142,29 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                   'image', 'text', 'cooking_time',)
         read_only_fields = ('author',)
 
+    def __create_ingredients(self, recipe, ingredients_data):
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                ingredient_id=ingredient['id'],
+                recipe=recipe, amount=ingredient['amount']
+            ) for ingredient in ingredients_data
+        )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        for ingredient in ingredients_data:
-            amount = ingredient['amount']
-            id = ingredient['id']
-            RecipeIngredient.objects.create(
-                ingredient=get_object_or_404(Ingredient, id=id),
-                recipe=recipe, amount=amount
-            )
-        for tag in tags_data:
-            recipe.tags.add(tag)
+        self.__create_ingredients(recipe, ingredients_data)
+        recipe.tags.add(*tags_data)
+        schedule_index_recipe(recipe.id)
         return recipe
 
     def validate(self, data):
         ingredients_data = data['ingredients']
         ingredients_set = set()
+        unknown_ingredients = get_reference_data().find_unknown_ingredients(
+            ingredient['id'] for ingredient in ingredients_data)
         for ingredient in ingredients_data:
             if ingredient['amount'] <= 0:
                 raise serializers.ValidationError(
@@ -145,9 +174,14 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Ингредиент в рецепте не должен повторяться.'
                 )
+            if ingredient['id'] in unknown_ingredients:
+                raise serializers.ValidationError(
+                    f'Ингредиента с id {ingredient["id"]} не существует.'
+                )
             ingredients_set.add(ingredient['id'])
         return data
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
@@ -159,15 +193,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
 
         RecipeIngredient.objects.filter(recipe=instance).delete()
-        for ingredient in ingredients_data:
-            amount = ingredient['amount']
-            id = ingredient['id']
-            RecipeIngredient.objects.create(
-                ingredient=get_object_or_404(Ingredient, id=id),
-                recipe=instance, amount=amount
-            )
+        self.__create_ingredients(instance, ingredients_data)
         instance.save()
         instance.tags.set(tags_data)
+        schedule_index_recipe(instance.id)
         return instance
 
     def to_representation(self, instance):
@@ -184,7 +213,31 @@ class FavAndShoppingCartSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time',)
 
 
-class SubscriptionListSerializer(serializers.ModelSerializer):
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX_LENGTH
+    )
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=('GET',), default='GET')
+    url = serializers.RegexField(r'^/api/')
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchRequestSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f'Не больше {settings.BATCH_MAX_REQUESTS} подзапросов.')
+        return value
+
+
+class SubscriptionListSerializer(SparseFieldsetMixin,
+                                 serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
@@ -202,8 +255,7 @@ class SubscriptionListSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if self.__get_user_is_authorized_or_not(obj) is True:
-            return Subscription.objects.filter(
-                user=request.user, author=obj).exists()
+            return obj.id in get_memberships(request, Subscription)
 
     def get_recipes(self, obj):
         request = self.context.get('request')
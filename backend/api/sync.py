@@ -0,0 +1,132 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Recipe, RecipeTombstone
+
+SINCE_PARAM = 'since'
+LIMIT_PARAM = 'limit'
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+INVALID_TOKEN_MSG = 'Некорректный токен синхронизации.'
+INVALID_LIMIT_MSG = f'Ожидается целое число от 1 до {MAX_LIMIT}.'
+
+
+class ChangesCursor:
+    """
+    Позиция клиента в журнале изменений: последние переданные
+    (updated_at, id) рецепта и (deleted_at, id) записи об удалении.
+    В запросах передаётся непрозрачным токеном.
+    """
+
+    def __init__(self, recipe_position, tombstone_position):
+        self.recipe_position = recipe_position
+        self.tombstone_position = tombstone_position
+
+    @classmethod
+    def initial(cls, now):
+        # Удаления до первой синхронизации клиенту не нужны.
+        return cls(None, (now, 0))
+
+    @classmethod
+    def decode(cls, token):
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(token.encode()))
+            return cls(*(
+                None if position is None
+                else (cls.parse_timestamp(position[0]), int(position[1]))
+                for position in raw
+            ))
+        except (binascii.Error, ValueError, TypeError, IndexError):
+            raise ValidationError({SINCE_PARAM: INVALID_TOKEN_MSG})
+
+    @staticmethod
+    def parse_timestamp(value):
+        timestamp = parse_datetime(value)
+        if timestamp is None or timezone.is_naive(timestamp):
+            raise ValueError(value)
+        return timestamp
+
+    def encode(self):
+        raw = [
+            None if position is None
+            else [position[0].isoformat(), position[1]]
+            for position in (self.recipe_position, self.tombstone_position)
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(raw, separators=(',', ':')).encode()).decode()
+
+
+def after(position, field):
+    """ Условие keyset-выборки строк, следующих за позицией (field, id). """
+
+    if position is None:
+        return Q()
+    timestamp, id = position
+    return (Q(**{f'{field}__gt': timestamp})
+            | Q(**{field: timestamp, 'id__gt': id}))
+
+
+def get_limit(request):
+    value = request.query_params.get(LIMIT_PARAM)
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValidationError({LIMIT_PARAM: INVALID_LIMIT_MSG})
+    return limit
+
+
+def get_recipe_changes(request, row_fields):
+    """
+    Страница изменений после токена ?since=: строки рецептов, созданных
+    или изменённых после позиции курсора, id удалённых рецептов и курсор
+    для следующего запроса.
+
+    Изменения моложе RECIPE_CHANGES_SETTLE_SECONDS не отдаются: их
+    транзакции могли ещё не завершиться, а строки с более ранней меткой
+    времени, зафиксированные после выдачи курсора, клиент бы пропустил.
+    """
+
+    now = timezone.now()
+    until = now - timedelta(seconds=settings.RECIPE_CHANGES_SETTLE_SECONDS)
+    token = request.query_params.get(SINCE_PARAM)
+    cursor = (ChangesCursor.decode(token) if token
+              else ChangesCursor.initial(until))
+    limit = get_limit(request)
+
+    recipes = list(Recipe.objects.filter(
+        after(cursor.recipe_position, 'updated_at'),
+        updated_at__lte=until
+    ).order_by('updated_at', 'id').values(
+        'updated_at', *row_fields)[:limit + 1])
+    tombstones = list(RecipeTombstone.objects.filter(
+        after(cursor.tombstone_position, 'deleted_at'),
+        deleted_at__lte=until
+    ).order_by('deleted_at', 'id').values_list(
+        'deleted_at', 'id', 'recipe_id')[:limit + 1])
+    has_more = len(recipes) > limit or len(tombstones) > limit
+    recipes = recipes[:limit]
+    tombstones = tombstones[:limit]
+
+    if recipes:
+        cursor.recipe_position = (recipes[-1]['updated_at'],
+                                  recipes[-1]['id'])
+    if tombstones:
+        cursor.tombstone_position = tombstones[-1][:2]
+    return {
+        'recipes': recipes,
+        'deleted': [recipe_id for _, _, recipe_id in tombstones],
+        'next': cursor.encode(),
+        'has_more': has_more,
+    }
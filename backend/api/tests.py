@@ -0,0 +1,663 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.http import FileResponse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.storage import image_storage
+from users.models import Subscription, User
+
+from . import export, pdf_pool, throttling
+from .delivery import send_file
+from .fast_serializers import (FastRecipeListSerializer,
+                               FastSubscriptionListSerializer)
+from .serializers import (BULK_RECIPES_MAX_LENGTH, RecipeListSerializer,
+                          SubscriptionListSerializer)
+from .throttling import CostThrottle
+from .views import ACCOUNT_EXPORT_COST, CustomUserViewSet
+
+
+class FastSerializersContractTest(TestCase):
+    """ Быстрые сериализаторы списков отдают тот же JSON, что и DRF. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Тестовый', password='pass')
+        authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Автор', last_name=str(number), password='pass')
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('мука', 'г'), ('молоко', 'мл'), ('яйца', 'шт'))
+        ]
+        added_at = timezone.now()
+        for number in range(9):
+            recipe = Recipe.objects.create(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}', text='Описание',
+                image=f'recipes/{number}.gif', cooking_time=number + 1)
+            Recipe.objects.filter(id=recipe.id).update(
+                added_at=added_at - timedelta(minutes=number))
+            recipe.tags.set(tags[:number % len(tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=number + index + 1)
+                for index, ingredient in enumerate(
+                    ingredients[:number % len(ingredients) + 1])
+            )
+        recipes = list(Recipe.objects.order_by('id'))
+        Favorite.objects.create(user=cls.reader, recipe=recipes[0])
+        ShoppingCart.objects.create(user=cls.reader, recipe=recipes[1])
+        Subscription.objects.create(user=cls.reader, author=authors[0])
+
+    def get_context(self, user, **params):
+        request = Request(APIRequestFactory().get('/api/', params))
+        request.user = user
+        return {'request': request}
+
+    def assert_same_json(self, serializer_class, fast_serializer_class,
+                         queryset, context):
+        renderer = JSONRenderer()
+        fast_serializer = fast_serializer_class(context=context)
+        fast_serializer.instance = queryset.values(
+            *fast_serializer.row_fields)
+        self.assertEqual(
+            renderer.render(fast_serializer.data),
+            renderer.render(serializer_class(
+                queryset, many=True, context=context).data))
+
+    def test_recipe_list(self):
+        for user in (self.reader, User.objects.get(username='author1'),
+                     AnonymousUser()):
+            for params in ({}, {'fields': 'id,tags,is_favorited'},
+                           {'omit': 'ingredients,author'}):
+                with self.subTest(user=user.username, params=params):
+                    self.assert_same_json(
+                        RecipeListSerializer, FastRecipeListSerializer,
+                        Recipe.objects.all(),
+                        self.get_context(user, **params))
+
+    def test_subscription_list(self):
+        authors = User.objects.filter(
+            recipes__isnull=False).distinct().order_by('id')
+        for params in ({}, {'recipes_limit': 2}, {'recipes_limit': 0},
+                       {'recipes_limit': 1, 'omit': 'recipes'},
+                       {'fields': 'id,recipes_count'}):
+            with self.subTest(params=params):
+                self.assert_same_json(
+                    SubscriptionListSerializer,
+                    FastSubscriptionListSerializer,
+                    authors, self.get_context(self.reader, **params))
+
+
+@override_settings(PDF_RENDER_WORKERS=0)
+class ShoppingCartJobTest(TestCase):
+    """
+    Статус фоновой задачи PDF хранится в PDF_JOBS_DIR и не зависит от
+    кеша процесса, который её запустил.
+    """
+
+    def setUp(self):
+        self.user, self.other = [
+            User.objects.create_user(
+                username=username, email=f'{username}@example.com',
+                first_name='Имя', last_name='Фамилия', password='pass')
+            for username in ('user', 'other')
+        ]
+        jobs_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, jobs_dir)
+        jobs_settings = override_settings(PDF_JOBS_DIR=jobs_dir)
+        jobs_settings.enable()
+        self.addCleanup(jobs_settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_job_visible_without_cache(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'async': 1})
+        self.assertEqual(response.status_code, 202)
+        job_url = response.json()['url']
+        for cache in caches.all():
+            cache.clear()
+        response = self.client.get(job_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content)[:5], b'%PDF-')
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(job_url).status_code, 404)
+
+    def test_job_states(self):
+        job_id = '0' * 32
+        self.assertIsNone(pdf_pool.get_job_status(job_id, self.user.id))
+        job = {'user_id': self.user.id, 'status': pdf_pool.JOB_PENDING}
+        pdf_pool.write_job(job_id, job)
+        self.assertEqual(pdf_pool.get_job_status(job_id, self.user.id),
+                         pdf_pool.JOB_PENDING)
+        pdf_pool.write_job(job_id, {**job, 'status': pdf_pool.JOB_FAILED})
+        self.assertEqual(pdf_pool.get_job_status(job_id, self.user.id),
+                         pdf_pool.JOB_FAILED)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Планы запросов проверяются только на PostgreSQL.')
+class QueryPlanTest(TestCase):
+    """
+    Запросы основных эндпоинтов к таблицам от MIN_ROWS строк не читают
+    их полным сканированием (check_query_plans).
+    """
+
+    MIN_ROWS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.media_root = tempfile.mkdtemp()
+        with override_settings(MEDIA_ROOT=cls.media_root):
+            call_command('generate_data', users=200, recipes=2000,
+                         stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media_root)
+
+    def test_no_sequential_scans(self):
+        output = StringIO()
+        try:
+            call_command('check_query_plans', min_rows=self.MIN_ROWS,
+                         stdout=output)
+        except CommandError as error:
+            self.fail(f'{error}\n{output.getvalue()}')
+
+
+class RecipeDetailQueryTest(TestCase):
+    """
+    Рецепт читается без подзапросов избранного и списка покупок, автор
+    присоединяется, только если он есть в ответе.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='Рецепт', text='Описание',
+            image='recipes/recipe.gif', cooking_time=10)
+        Favorite.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def get_recipe_query(self, params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(f'/api/recipes/{self.recipe.id}/', params)
+        self.assertEqual(response.status_code, 200)
+        recipe_table = Recipe._meta.db_table
+        return response.json(), next(
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+            and f'FROM "{recipe_table}"' in query['sql'])
+
+    def test_no_membership_subqueries(self):
+        data, sql = self.get_recipe_query({})
+        self.assertTrue(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+        self.assertNotIn('EXISTS', sql)
+        self.assertIn(f'JOIN "{User._meta.db_table}"', sql)
+
+    def test_author_join_follows_fieldset(self):
+        for params in ({'omit': 'author'}, {'fields': 'id,name'}):
+            with self.subTest(params=params):
+                data, sql = self.get_recipe_query(params)
+                self.assertNotIn('author', data)
+                self.assertNotIn('JOIN', sql)
+
+
+@override_settings(RECIPE_CHANGES_SETTLE_SECONDS=0)
+class RecipeChangesTest(TestCase):
+    """
+    Журнал изменений /api/recipes/changes/: курсор по (updated_at, id),
+    удалённые рецепты в deleted, правки тегов и ингредиентов меняют
+    рецепты, которые их содержат.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        self.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г')
+        self.recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}',
+                text='Описание', image='recipes/recipe.gif',
+                cooking_time=10)
+            self.recipes.append(recipe)
+        self.recipes[0].tags.add(self.tag)
+        RecipeIngredient.objects.create(
+            recipe=self.recipes[1], ingredient=self.ingredient, amount=100)
+        # Одна метка времени: порядок внутри неё задаёт id.
+        self.settled_at = timezone.now() - timedelta(minutes=1)
+        Recipe.objects.update(updated_at=self.settled_at)
+        self.client = APIClient()
+
+    def get_changes(self, **params):
+        response = self.client.get('/api/recipes/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_changed_ids(self, changes):
+        return [recipe['id'] for recipe in changes['changed']]
+
+    def test_cursor_round_trip(self):
+        changes = self.get_changes(limit=2)
+        self.assertEqual(self.get_changed_ids(changes),
+                         [recipe.id for recipe in self.recipes[:2]])
+        self.assertTrue(changes['has_more'])
+        changes = self.get_changes(since=changes['next'], limit=2)
+        self.assertEqual(self.get_changed_ids(changes), [self.recipes[2].id])
+        self.assertFalse(changes['has_more'])
+        changes = self.get_changes(since=changes['next'])
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['deleted'], [])
+
+    def test_invalid_token(self):
+        response = self.client.get(
+            '/api/recipes/changes/', {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('since', response.json())
+
+    def test_deleted_recipes(self):
+        token = self.get_changes()['next']
+        recipe_id = self.recipes[2].id
+        self.recipes[2].delete()
+        changes = self.get_changes(since=token)
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['deleted'], [recipe_id])
+        changes = self.get_changes(since=changes['next'])
+        self.assertEqual(changes['deleted'], [])
+
+    def test_recent_changes_held_back(self):
+        token = self.get_changes()['next']
+        recipe = self.recipes[0]
+        recipe.name = 'Новое название'
+        recipe.save()
+        with override_settings(RECIPE_CHANGES_SETTLE_SECONDS=60):
+            changes = self.get_changes(since=token)
+            self.assertEqual(changes['changed'], [])
+            token = changes['next']
+        changes = self.get_changes(since=token)
+        self.assertEqual(self.get_changed_ids(changes), [recipe.id])
+        self.assertEqual(changes['changed'][0]['name'], 'Новое название')
+
+    def test_reference_edits_touch_recipes(self):
+        token = self.get_changes()['next']
+        self.tag.name = 'Утро'
+        self.tag.save()
+        changes = self.get_changes(since=token)
+        self.assertEqual(self.get_changed_ids(changes), [self.recipes[0].id])
+        self.assertEqual(changes['changed'][0]['tags'][0]['name'], 'Утро')
+        self.ingredient.name = 'мука пшеничная'
+        self.ingredient.save()
+        changes = self.get_changes(since=changes['next'])
+        self.assertEqual(self.get_changed_ids(changes), [self.recipes[1].id])
+
+
+class BulkMembershipTest(TestCase):
+    """
+    Массовые операции с избранным и списком покупок выполняются
+    фиксированным числом запросов независимо от длины списка.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user, self.other = [
+            User.objects.create_user(
+                username=username, email=f'{username}@example.com',
+                first_name='Имя', last_name='Фамилия', password='pass')
+            for username in ('user', 'other')
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.other, name=f'Рецепт {number}',
+                text='Описание', image='recipes/recipe.gif',
+                cooking_time=10)
+            for number in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [(result['id'], result['status'])
+                for result in response.json()['results']]
+
+    def test_add_partial_conflict(self):
+        first, second, third = self.recipes
+        Favorite.objects.create(user=self.user, recipe=first)
+        missing_id = third.id + 1
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                '/api/recipes/favorite/',
+                {'recipes': [first.id, second.id, second.id, missing_id]},
+                format='json')
+        self.assertEqual(self.get_statuses(response), [
+            (first.id, 'already_added'),
+            (second.id, 'added'),
+            (missing_id, 'not_found'),
+        ])
+        self.assertEqual(set(Favorite.objects.filter(
+            user=self.user).values_list('recipe_id', flat=True)),
+            {first.id, second.id})
+
+    def test_remove_partial(self):
+        first, second, _ = self.recipes
+        ShoppingCart.objects.create(user=self.user, recipe=first)
+        ShoppingCart.objects.create(user=self.other, recipe=second)
+        with self.assertNumQueries(3):
+            response = self.client.delete(
+                '/api/recipes/shopping_cart/',
+                {'recipes': [first.id, second.id]}, format='json')
+        self.assertEqual(self.get_statuses(response), [
+            (first.id, 'removed'),
+            (second.id, 'not_added'),
+        ])
+        self.assertFalse(
+            ShoppingCart.objects.filter(user=self.user).exists())
+        self.assertTrue(
+            ShoppingCart.objects.filter(user=self.other).exists())
+
+    def test_length_cap(self):
+        recipe_ids = list(range(1, BULK_RECIPES_MAX_LENGTH + 2))
+        with self.assertNumQueries(0):
+            response = self.client.post(
+                '/api/recipes/favorite/', {'recipes': recipe_ids},
+                format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recipes', response.json())
+        response = self.client.post(
+            '/api/recipes/favorite/',
+            {'recipes': recipe_ids[:BULK_RECIPES_MAX_LENGTH]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        for body in ({'recipes': []}, {}):
+            with self.subTest(body=body):
+                response = self.client.post(
+                    '/api/recipes/favorite/', body, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_clear_is_single_delete(self):
+        for recipe in self.recipes:
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.other, recipe=self.recipes[0])
+        with self.assertNumQueries(1):
+            response = self.client.delete('/api/recipes/shopping_cart/clear/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            ShoppingCart.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.other).count(), 1)
+
+
+class CostThrottleTest(TestCase):
+    """
+    Корзина токенов: запросы списывают свою стоимость, пустая корзина
+    отвечает 429 с Retry-After и пополняется со временем.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        throttling._buckets.clear()
+        self.addCleanup(throttling._buckets.clear)
+        self.now = 1000.0
+        clock = mock.patch.object(throttling, 'time')
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        self.clock.monotonic.side_effect = lambda: self.now
+        self.clock.time.side_effect = lambda: self.now
+        throttles = mock.patch.object(
+            CustomUserViewSet, 'throttle_classes', [CostThrottle])
+        throttles.start()
+        self.addCleanup(throttles.stop)
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def set_rate(self, rate):
+        rates = mock.patch.object(CostThrottle, 'THROTTLE_RATES',
+                                  {'user': rate})
+        rates.start()
+        self.addCleanup(rates.stop)
+
+    def get_me(self):
+        return self.client.get('/api/users/me/')
+
+    def get_export(self):
+        return self.client.get('/api/users/me/export/', {'type': 'ndjson'})
+
+    def test_bucket_exhausted_and_refilled(self):
+        self.set_rate('3/min')
+        for _ in range(3):
+            self.assertEqual(self.get_me().status_code, 200)
+        response = self.get_me()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        self.now += 20
+        self.assertEqual(self.get_me().status_code, 200)
+        self.assertEqual(self.get_me().status_code, 429)
+
+    def test_export_cost(self):
+        self.set_rate(f'{ACCOUNT_EXPORT_COST * 2}/min')
+        for _ in range(2):
+            self.assertEqual(self.get_export().status_code, 200)
+        response = self.get_export()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.get_me().status_code, 429)
+        # За 29 с набирается 58 токенов, запрос /me/ списывает один.
+        self.now += 29
+        self.assertEqual(self.get_me().status_code, 200)
+        self.assertEqual(self.get_export().status_code, 429)
+        self.now += 1.5
+        self.assertEqual(self.get_export().status_code, 200)
+
+    @override_settings(THROTTLE_CACHE='default')
+    def test_shared_budget(self):
+        self.set_rate('2/min')
+        for _ in range(2):
+            self.assertEqual(self.get_me().status_code, 200)
+        # Другой процесс: своя корзина полна, общий бюджет исчерпан.
+        throttling._buckets.clear()
+        self.assertEqual(self.get_me().status_code, 429)
+        self.now += 30
+        self.assertEqual(self.get_me().status_code, 200)
+
+
+class SendFileTest(TestCase):
+    """
+    X-Accel-Redirect указывает путь внутри PROTECTED_ROOT; файлы вне его
+    отдаются самим Django.
+    """
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.root = os.path.join(directory, 'protected')
+        self.outside = os.path.join(directory, 'jobs')
+        for path in (self.root, self.outside):
+            os.mkdir(path)
+        root_settings = override_settings(
+            PROTECTED_ROOT=self.root, FILE_DELIVERY_BACKEND='x-accel-redirect')
+        root_settings.enable()
+        self.addCleanup(root_settings.disable)
+
+    def create_file(self, *parts):
+        path = os.path.join(*parts)
+        with open(path, 'wb') as file:
+            file.write(b'%PDF')
+        return path
+
+    def test_inside_protected_root(self):
+        path = self.create_file(self.root, 'cart.pdf')
+        response = send_file(path, 'cart.pdf')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/cart.pdf')
+
+    def test_outside_protected_root(self):
+        self.create_file(self.outside, 'cart.pdf')
+        for path in (os.path.join(self.outside, 'cart.pdf'),
+                     os.path.join(self.root, '..', 'jobs', 'cart.pdf')):
+            with self.subTest(path=path):
+                response = send_file(path, 'cart.pdf')
+                self.assertIsInstance(response, FileResponse)
+                self.assertNotIn('X-Accel-Redirect', response)
+                self.assertEqual(b''.join(response.streaming_content),
+                                 b'%PDF')
+
+
+class AccountExportTest(TestCase):
+    """
+    Выгрузка аккаунта: ZIP с data.ndjson и изображениями рецептов или
+    NDJSON со ссылками на изображения.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user, self.author = [
+            User.objects.create_user(
+                username=username, email=f'{username}@example.com',
+                first_name='Имя', last_name='Фамилия', password='pass')
+            for username in ('user', 'author')
+        ]
+        self.image = image_storage.save(
+            'recipes/recipe.gif', ContentFile(b'GIF89a'))
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Блины', text='Описание',
+            image=self.image, cooking_time=30)
+        # Файла нет в хранилище: в архив не попадает.
+        Recipe.objects.create(
+            author=self.user, name='Оладьи', text='Описание',
+            image='recipes/missing.gif', cooking_time=20)
+        tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.recipe.tags.add(tag)
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г')
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=200)
+        other_recipe = Recipe.objects.create(
+            author=self.author, name='Суп', text='Описание',
+            image='recipes/soup.gif', cooking_time=60)
+        Favorite.objects.create(user=self.user, recipe=other_recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.other_recipe = other_recipe
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_export(self, params):
+        response = self.client.get('/api/users/me/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def parse_records(self, data):
+        records = [json.loads(line) for line in data.splitlines()]
+        return [(record['type'], record['data']) for record in records]
+
+    def assert_records(self, records, image_values):
+        recipes = [data for record_type, data in records
+                   if record_type == 'recipe']
+        self.assertEqual([recipe['name'] for recipe in recipes],
+                         ['Блины', 'Оладьи'])
+        self.assertEqual([recipe['image'] for recipe in recipes],
+                         image_values)
+        self.assertEqual(recipes[0]['author'], 'user')
+        self.assertEqual(recipes[0]['tags'], ['breakfast'])
+        self.assertEqual(recipes[0]['ingredients'], [
+            {'name': 'мука', 'measurement_unit': 'г', 'amount': 200}])
+        self.assertEqual(records[len(recipes):], [
+            ('favorite', {'recipe_id': self.other_recipe.id,
+                          'recipe__name': 'Суп'}),
+            ('shopping_cart', {'recipe_id': self.recipe.id,
+                               'recipe__name': 'Блины'}),
+            ('subscription', {'author_id': self.author.id,
+                              'author__username': 'author'}),
+        ])
+
+    def test_zip(self):
+        response, data = self.get_export({})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('foodgram-user.zip', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(), [
+                export.DATA_FILE, f'{export.IMAGES_DIR}/{self.image}'])
+            self.assertEqual(
+                archive.read(f'{export.IMAGES_DIR}/{self.image}'), b'GIF89a')
+            records = self.parse_records(archive.read(export.DATA_FILE))
+        self.assert_records(records, [
+            f'{export.IMAGES_DIR}/{self.image}',
+            f'{export.IMAGES_DIR}/recipes/missing.gif',
+        ])
+
+    def test_ndjson(self):
+        response, data = self.get_export({'type': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('foodgram-user.ndjson',
+                      response['Content-Disposition'])
+        self.assert_records(self.parse_records(data), [
+            f'http://testserver/media/{self.image}',
+            'http://testserver/media/recipes/missing.gif',
+        ])
+
+    def test_only_own_data(self):
+        self.client.force_authenticate(self.author)
+        _, data = self.get_export({'type': 'ndjson'})
+        self.assertEqual(
+            [(record_type, data['name']) for record_type, data
+             in self.parse_records(data)],
+            [('recipe', 'Суп')])
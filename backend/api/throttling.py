@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+DEFAULT_COST = 1
+# Стоимость страницы списка: одна единица за каждые PAGE_COST_ROWS
+# отданных строк и за каждые OFFSET_COST_ROWS пропущенных через OFFSET.
+PAGE_COST_ROWS = 25
+OFFSET_COST_ROWS = 500
+MAX_LOCAL_BUCKETS = 10000
+
+_buckets = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_request_cost(request, view):
+    get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+    if get_throttle_cost is None:
+        return DEFAULT_COST
+    return get_throttle_cost(request)
+
+
+def get_rows_cost(rows, skipped=0):
+    return DEFAULT_COST + rows // PAGE_COST_ROWS + skipped // OFFSET_COST_ROWS
+
+
+def get_page_cost(request, paginator):
+    """ Стоимость запроса страницы с учётом её размера и смещения. """
+
+    page_size = paginator.get_page_size(request) or 0
+    try:
+        page = max(int(request.query_params.get(
+            paginator.page_query_param, 1)), 1)
+    except ValueError:
+        page = 1
+    return get_rows_cost(page_size, (page - 1) * page_size)
+
+
+def refill(state, capacity, rate, now):
+    tokens, updated = state or (capacity, now)
+    return min(capacity, tokens + max(now - updated, 0) * rate)
+
+
+def take_local(key, cost, capacity, rate):
+    """ Списание из корзины процесса: (списано ли, остаток). """
+
+    now = time.monotonic()
+    with _lock:
+        tokens = refill(_buckets.pop(key, None), capacity, rate, now)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        _buckets[key] = (tokens, now)
+        if len(_buckets) > MAX_LOCAL_BUCKETS:
+            _buckets.popitem(last=False)
+    return allowed, tokens
+
+
+def refund_local(key, cost, capacity):
+    with _lock:
+        state = _buckets.get(key)
+        if state is not None:
+            _buckets[key] = (min(capacity, state[0] + cost), state[1])
+
+
+def take_shared(key, cost, capacity, rate):
+    """
+    Списание из корзины в общем кеше. Чтение и запись не атомарны:
+    при одновременных запросах клиента бюджет может быть немного
+    превышен, зато нет блокировок между процессами.
+    """
+
+    cache = caches[settings.THROTTLE_CACHE]
+    now = time.time()
+    tokens = refill(cache.get(key), capacity, rate, now)
+    allowed = tokens >= cost
+    if allowed:
+        tokens -= cost
+    cache.set(key, (tokens, now), int(capacity / rate) + 1)
+    return allowed, tokens
+
+
+class CostThrottle(SimpleRateThrottle):
+    """
+    Корзина токенов на клиента: ёмкость и скорость пополнения задаются
+    частотой вида '600/min', запрос списывает столько токенов, сколько
+    стоит (метод get_throttle_cost представления, по умолчанию 1).
+
+    Корзины хранятся в памяти процесса; если задан THROTTLE_CACHE, общий
+    бюджет всех процессов ведётся в этом кеше, а корзина процесса
+    отсекает клиентов, исчерпавших бюджет, без обращения к кешу.
+    """
+
+    cache_format = 'throttle:{scope}:{ident}'
+
+    def __init__(self):
+        # Частота определяется в allow_request по типу клиента.
+        pass
+
+    def get_scope(self, request, view):
+        return 'user' if request.user.is_authenticated else 'anon'
+
+    def get_ident_key(self, request, view):
+        if request.user.is_authenticated:
+            return str(request.user.pk)
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        num_requests, duration = self.parse_rate(self.rate)
+        capacity, rate = num_requests, num_requests / duration
+        cost = min(get_request_cost(request, view), capacity)
+        key = self.cache_format.format(
+            scope=self.scope, ident=self.get_ident_key(request, view))
+
+        allowed, tokens = take_local(key, cost, capacity, rate)
+        if allowed and settings.THROTTLE_CACHE:
+            allowed, tokens = take_shared(key, cost, capacity, rate)
+            if not allowed:
+                refund_local(key, cost, capacity)
+        self.retry_after = None if allowed else (cost - tokens) / rate
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class EndpointCostThrottle(CostThrottle):
+    """ Отдельная корзина клиента для каждого эндпоинта. """
+
+    def get_scope(self, request, view):
+        return 'endpoint'
+
+    def get_ident_key(self, request, view):
+        endpoint = type(view).__name__
+        action = getattr(view, 'action', None)
+        if action:
+            endpoint = f'{endpoint}.{action}'
+        return f'{endpoint}:{super().get_ident_key(request, view)}'
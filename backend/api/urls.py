@@ -1,16 +1,19 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientViewSet, RecipeViewSet, SubscriptionListView,
+from .views import (BatchView, CustomUserViewSet, IngredientViewSet,
+                    RecipeViewSet, SubscriptionListView,
                     SubscriptionManagementView, TagViewSet)
 
 router = DefaultRouter()
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
+router.register('users', CustomUserViewSet, basename='users')
 
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
     path(
         'users/subscriptions/', SubscriptionListView.as_view(),
         name='subscription'
@@ -18,6 +21,5 @@ urlpatterns = [
     path('users/<int:id>/subscribe/',
          SubscriptionManagementView.as_view(), name='subscribe'),
     path('', include(router.urls)),
-    path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
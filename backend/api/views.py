@@ -1,35 +1,49 @@
 from io import BytesIO
 
 from django.conf import settings
-from django.db.models import Sum
+from django.db.models import Q, Sum
 from django.db.models.expressions import Exists, OuterRef
-from django.http import FileResponse
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
-from reportlab import rl_config
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from djoser.views import UserViewSet
 from rest_framework import generics, status, views, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
+from recipes.memberships import invalidate_memberships
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.similarity import find_similar
 from users.models import Subscription, User
 
+from . import export, pdf_pool
+from .batch import run_batch
+from .delivery import send_file
+from .fast_serializers import (FastRecipeListSerializer,
+                               FastSubscriptionListSerializer)
 from .filters import IngredientFilter, RecipeFilter
-from .paginations import CustomPageNumberPagination
+from .mixins import EncodedReferenceListMixin, get_sparse_field_names
+from .paginations import (CustomPageNumberPagination,
+                          PageNumberOrCursorPagination)
 from .permissions import IsAdminOrAuthorOrReadOnly
-from .serializers import (FavAndShoppingCartSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeListSerializer,
-                          SubscribeSerializer, SubscriptionListSerializer,
-                          TagSerializer)
+from .serializers import (BatchSerializer, FavAndShoppingCartSerializer,
+                          IngredientSerializer, RecipeCreateSerializer,
+                          RecipeIdsSerializer, RecipeListSerializer,
+                          SubscribeSerializer, TagSerializer)
+from .sync import get_limit, get_recipe_changes
+from .throttling import get_page_cost, get_rows_cost
 
+SIMILAR_RECIPES_LIMIT = 6
+# Стоимость запросов в токенах корзин CostThrottle (обычный запрос - 1).
+INGREDIENTS_LIST_COST = 10
+SHOPPING_CART_PDF_COST = 30
+ACCOUNT_EXPORT_COST = 60
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(EncodedReferenceListMixin, viewsets.ReadOnlyModelViewSet):
     """ Вьюсет для просмотра тэгов. """
 
     queryset = Tag.objects.all()
@@ -38,7 +52,8 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(EncodedReferenceListMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра ингредиентов. """
 
     queryset = Ingredient.objects.all()
@@ -47,6 +62,11 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def get_throttle_cost(self, request):
+        if self.action == 'list' and not request.query_params:
+            return INGREDIENTS_LIST_COST
+        return 1
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """ Вьюсет для работы с рецептами. """
@@ -55,59 +75,95 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class = RecipeFilter
     pagination_class = CustomPageNumberPagination
     permission_classes = (IsAdminOrAuthorOrReadOnly,)
+    lookup_value_regex = r'\d+'
+
+    def get_throttle_cost(self, request):
+        if self.action == 'list':
+            return get_page_cost(request, self.paginator)
+        if self.action == 'changes':
+            return get_rows_cost(get_limit(request))
+        if self.action == 'download_shopping_cart':
+            return SHOPPING_CART_PDF_COST
+        return 1
 
     def get_queryset(self):
-        user = self.request.user
-        if user.is_authenticated:
-            return Recipe.objects.annotate(
-                is_favorited=Exists(Favorite.objects.filter(
-                    user=user, recipe=OuterRef('id'))
-                ),
-                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
-                    user=user, recipe=OuterRef('id'))
-                )
-            ).select_related('author',)
-        return Recipe.objects.all()
+        # is_favorited и is_in_shopping_cart берутся из множеств
+        # get_memberships, автор присоединяется, только если он в ответе.
+        queryset = Recipe.objects.all()
+        if 'author' in get_sparse_field_names(
+                self.request, RecipeListSerializer.Meta.fields):
+            queryset = queryset.select_related('author')
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeListSerializer
         return RecipeCreateSerializer
 
+    def list(self, request, *args, **kwargs):
+        serializer = FastRecipeListSerializer(
+            context=self.get_serializer_context())
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *serializer.row_fields)
+        page = self.paginate_queryset(queryset)
+        serializer.instance = queryset if page is None else page
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=False)
+    def changes(self, request):
+        """ Рецепты, созданные, изменённые или удалённые после ?since=. """
+
+        serializer = FastRecipeListSerializer(
+            context=self.get_serializer_context())
+        changes = get_recipe_changes(request, serializer.row_fields)
+        serializer.instance = changes.pop('recipes')
+        return Response({'changed': serializer.data, **changes})
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk=None):
+        """ Рецепты с похожим набором ингредиентов и тэгов. """
+
+        get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        serializer = FastRecipeListSerializer(
+            context=self.get_serializer_context())
+        similar_ids = find_similar(int(pk), SIMILAR_RECIPES_LIMIT)
+        rows = {
+            row['id']: row
+            for row in Recipe.objects.filter(
+                id__in=similar_ids).values(*serializer.row_fields)
+        }
+        serializer.instance = [
+            rows[recipe_id] for recipe_id in similar_ids if recipe_id in rows
+        ]
+        return Response(serializer.data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def __make_fav_shop_cart_action(self, request, use_model, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = self.request.user
-        if user.is_anonymous:
-            return Response(status=status.HTTP_401_UNAUTHORIZED)
-        checked_queryset = use_model.objects.filter(
-            user=user, recipe=recipe)
+        user = request.user
         if request.method == 'POST':
-            if not checked_queryset:
-                created = use_model.objects.create(user=user, recipe=recipe)
-                serializer = FavAndShoppingCartSerializer(created.recipe)
+            if use_model.objects.add(user, pk):
+                serializer = FavAndShoppingCartSerializer(
+                    get_object_or_404(Recipe, pk=pk))
                 return Response(
                     status=status.HTTP_201_CREATED, data=serializer.data)
-            else:
-                if use_model == Favorite:
-                    data = {'errors': 'Этот рецепт уже в избранном.'}
-                elif use_model == ShoppingCart:
-                    data = {'errors': 'Этот рецепт уже в списке покупок.'}
-                return Response(status=status.HTTP_400_BAD_REQUEST, data=data)
-        elif request.method == 'DELETE':
-            if not checked_queryset:
-                if use_model == Favorite:
-                    data = {
-                        'errors': 'Этот рецепт не находится в избранном.'}
-                elif use_model == ShoppingCart:
-                    data = {
-                        'errors': 'Этот рецепт не находится в списке покупок.'}
-                return Response(status=status.HTTP_400_BAD_REQUEST, data=data)
-            else:
-                checked_queryset.delete()
-                return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+            if use_model == Favorite:
+                data = {'errors': 'Этот рецепт уже в избранном.'}
+            elif use_model == ShoppingCart:
+                data = {'errors': 'Этот рецепт уже в списке покупок.'}
+            return Response(status=status.HTTP_400_BAD_REQUEST, data=data)
+        if use_model.objects.remove(user, pk):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        if use_model == Favorite:
+            data = {'errors': 'Этот рецепт не находится в избранном.'}
+        elif use_model == ShoppingCart:
+            data = {'errors': 'Этот рецепт не находится в списке покупок.'}
+        return Response(status=status.HTTP_400_BAD_REQUEST, data=data)
 
     @action(
         methods=['post', 'delete'], detail=True,
@@ -129,65 +185,199 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.__make_fav_shop_cart_action(
             request, use_model=ShoppingCart, pk=pk)
 
+    def __make_bulk_fav_shop_cart_action(self, request, use_model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(
+            serializer.validated_data['recipes']))
+        found_ids = set(Recipe.objects.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        if request.method == 'POST':
+            existing = use_model.objects.add_many(request.user, found_ids)
+            statuses = {True: 'already_added', False: 'added'}
+        else:
+            existing = use_model.objects.remove_many(request.user, found_ids)
+            statuses = {True: 'removed', False: 'not_added'}
+        results = [
+            {
+                'id': recipe_id,
+                'status': (statuses[recipe_id in existing]
+                           if recipe_id in found_ids else 'not_found'),
+            }
+            for recipe_id in recipe_ids
+        ]
+        return Response({'results': results})
+
+    @action(
+        methods=['post', 'delete'], detail=False, url_path='favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_favorite(self, request):
+        """ Добавление/удаление списка рецептов в избранном. """
+
+        return self.__make_bulk_fav_shop_cart_action(
+            request, use_model=Favorite)
+
+    @action(
+        methods=['post', 'delete'], detail=False, url_path='shopping_cart',
+        permission_classes=[IsAuthenticated]
+    )
+    def bulk_shopping_cart(self, request):
+        """ Добавление/удаление списка рецептов в списке покупок. """
+
+        return self.__make_bulk_fav_shop_cart_action(
+            request, use_model=ShoppingCart)
+
+    @action(
+        methods=['delete'], detail=False, url_path='shopping_cart/clear',
+        permission_classes=[IsAuthenticated]
+    )
+    def clear_shopping_cart(self, request):
+        """ Очистка списка покупок. """
+
+        ShoppingCart.objects.remove_many(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(
         methods=['get'], detail=False,
         permission_classes=[IsAuthenticated]
     )
     def download_shopping_cart(self, request):
-        """ Скачивание списка покупок. """
-
-        buffer = BytesIO()
-        rl_config.TTFSearchPath.append(str(settings.BASE_DIR) + '/data')
-        pdfmetrics.registerFont(TTFont('FreeSans', 'FreeSans.ttf'))
-        pdf_obj = canvas.Canvas(buffer, pagesize=A4)
-        pdf_obj.setFont('FreeSans', 20)
-        queryset = RecipeIngredient.objects.filter(
+        """
+        Скачивание списка покупок. Большие списки и запросы с ?async=1
+        рендерятся в фоне: в ответ возвращается адрес задачи.
+        """
+
+        items = list(RecipeIngredient.objects.filter(
             recipe__shopping_cart__user=request.user).values(
                 'ingredient__name',
                 'ingredient__measurement_unit').annotate(
-                    total_amount=Sum('amount'))
-        pdf_title = 'Список покупок'
-        title_x_coord = 260
-        title_y_coord = 800
-        x_coord = 50
-        y_coord = 780
-        if queryset:
-            pdf_obj.drawCentredString(title_x_coord, title_y_coord, pdf_title)
-            for item in queryset:
-                pdf_obj.setFontSize(14)
-                pdf_obj.drawString(
-                    x_coord, y_coord,
-                    f"{item['ingredient__name']} - "
-                    f"{item['total_amount']} "
-                    f"{item['ingredient__measurement_unit']}"
+                    total_amount=Sum('amount')).values_list(
+                        'ingredient__name', 'total_amount',
+                        'ingredient__measurement_unit'))
+        try:
+            if (request.query_params.get('async')
+                    or len(items) > settings.PDF_ASYNC_THRESHOLD):
+                job_id = pdf_pool.start_job(request.user.id, items)
+                return Response(
+                    {
+                        'id': job_id,
+                        'status': pdf_pool.JOB_PENDING,
+                        'url': reverse(
+                            'recipes-shopping-cart-job',
+                            kwargs={'job_id': job_id}, request=request),
+                    },
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={'Retry-After': settings.PDF_RENDER_RETRY_AFTER}
                 )
-                y_coord -= 15
-                if y_coord < 30:
-                    pdf_obj.showPage()
-                    y_coord = 800
-        else:
-            pdf_obj.drawCentredString(
-                title_x_coord,
-                title_y_coord,
-                'Список покупок пуст.')
-        pdf_obj.showPage()
-        pdf_obj.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True,
+            content = pdf_pool.render(items)
+        except pdf_pool.RenderPoolBusyError:
+            return Response(
+                {'errors': 'Сервер перегружен, повторите запрос позже.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': settings.PDF_RENDER_RETRY_AFTER}
+            )
+        return FileResponse(BytesIO(content), as_attachment=True,
                             filename='shopping_cart.pdf')
 
+    @action(
+        methods=['get'], detail=False,
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{32})',
+        url_name='shopping-cart-job',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_job(self, request, job_id):
+        """ Статус фоновой задачи или готовый PDF списка покупок. """
+
+        job_status = pdf_pool.get_job_status(job_id, request.user.id)
+        if job_status is None:
+            return Response(
+                {'errors': 'Задача не найдена.'},
+                status=status.HTTP_404_NOT_FOUND)
+        if job_status == pdf_pool.JOB_PENDING:
+            return Response(
+                {'id': job_id, 'status': job_status},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Retry-After': settings.PDF_RENDER_RETRY_AFTER})
+        if job_status == pdf_pool.JOB_FAILED:
+            return Response(
+                {'errors': 'Не удалось сформировать список покупок.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return send_file(pdf_pool.get_job_path(job_id), 'shopping_cart.pdf',
+                         content_type='application/pdf')
+
+
+class CustomUserViewSet(UserViewSet):
+    """
+    Пользователи: признак подписки вычисляется подзапросом в том же
+    запросе к БД, список ищется по префиксу ?search= в username или email.
+    """
+
+    pagination_class = PageNumberOrCursorPagination
+
+    def get_throttle_cost(self, request):
+        if self.action == 'list':
+            return get_page_cost(request, self.paginator)
+        if self.action == 'export':
+            return ACCOUNT_EXPORT_COST
+        return 1
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        search = self.request.query_params.get('search')
+        if self.action == 'list' and search:
+            queryset = queryset.filter(
+                Q(username__startswith=search) | Q(email__startswith=search))
+        return queryset
+
+    @action(
+        methods=['get'], detail=False, url_path='me/export',
+        permission_classes=[IsAuthenticated]
+    )
+    def export(self, request):
+        """
+        Выгрузка рецептов, избранного, списка покупок и подписок текущего
+        пользователя: ZIP с изображениями или NDJSON (?type=ndjson).
+        Ответ формируется по мере чтения из БД и хранилища.
+        """
+
+        user = request.user
+        if request.query_params.get('type') == 'ndjson':
+            response = StreamingHttpResponse(
+                export.stream_ndjson(user, request),
+                content_type='application/x-ndjson')
+            extension = 'ndjson'
+        else:
+            response = StreamingHttpResponse(
+                export.stream_zip(user), content_type='application/zip')
+            extension = 'zip'
+        response['Content-Disposition'] = (
+            f'attachment; filename="foodgram-{user.username}.{extension}"')
+        return response
+
 
 class SubscriptionListView(generics.ListAPIView):
     """ Отображение подписок. """
     pagination_class = CustomPageNumberPagination
     permission_classes = [IsAuthenticated]
 
+    def get_throttle_cost(self, request):
+        return get_page_cost(request, self.paginator)
+
     def get(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
-        page = self.paginate_queryset(queryset)
-        serializer = SubscriptionListSerializer(
-            page, many=True, context={'request': request})
+        serializer = FastSubscriptionListSerializer(
+            context={'request': request})
+        queryset = User.objects.filter(following__user=user).order_by(
+            'id').values(*serializer.row_fields)
+        serializer.instance = self.paginate_queryset(queryset)
         return self.get_paginated_response(serializer.data)
 
 
@@ -209,4 +399,19 @@ class SubscriptionManagementView(views.APIView):
         author = get_object_or_404(User, id=id)
         follow = get_object_or_404(Subscription, user=user, author=author,)
         follow.delete()
+        invalidate_memberships(Subscription, user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchView(views.APIView):
+    """
+    Пакет GET-подзапросов к API в одном запросе: ответы возвращаются
+    списком {status, body} в порядке подзапросов.
+    """
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return run_batch(request, [
+            item['url'] for item in serializer.validated_data['requests']
+        ])
@@ -0,0 +1,69 @@
+import os
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django import setup
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def get_response_headers(response):
+    headers = [
+        (header.encode('ascii'), value.encode('latin1'))
+        for header, value in response.items()
+    ]
+    for cookie in response.cookies.values():
+        headers.append(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+class ThreadPerRequestASGIHandler(ASGIHandler):
+    """
+    ASGI-обработчик, в котором ожидание клиента (чтение тела запроса и
+    отправка ответа) выполняется в цикле событий, а синхронный код запроса
+    (middleware, вьюхи DRF, ORM) - в отдельном потоке этого запроса.
+
+    Стандартный обработчик Django 3.2 выполняет синхронные вьюхи всех
+    запросов в одном общем потоке, а потоковые ответы читает прямо в цикле
+    событий, где обращения к БД запрещены.
+    """
+
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            try:
+                await super().__call__(scope, receive, send)
+            finally:
+                # Поток запроса завершается вместе с ним, поэтому его
+                # соединения с БД закрываются (возвращаются в пул) сразу.
+                await sync_to_async(connections.close_all)()
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': get_response_headers(response),
+        })
+        # Части потокового ответа (выгрузка аккаунта, файлы) читаются в
+        # потоке запроса: генератор может обращаться к БД.
+        parts = iter(response)
+        next_part = sync_to_async(next)
+        while True:
+            part = await next_part(parts, None)
+            if part is None:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close)()
+
+
+setup(set_prefix=False)
+application = ThreadPerRequestASGIHandler()
@@ -0,0 +1,125 @@
+import gzip
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP = 'gzip'
+BROTLI = 'br'
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript',
+                      'application/xml', 'application/x-ndjson')
+# Атрибут ответа со словарём кодировка -> сжатое тело. Словарь хранится
+# вместе с закешированным телом, поэтому сжатие выполняется один раз.
+PRECOMPRESSED_ATTR = 'precompressed'
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def get_preferred_encodings():
+    return (BROTLI, GZIP) if brotli is not None else (GZIP,)
+
+
+def parse_accept_encoding(header):
+    codings = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            codings[coding.strip().lower()] = quality
+    return codings
+
+
+def choose_encoding(header):
+    codings = parse_accept_encoding(header)
+    for encoding in get_preferred_encodings():
+        if codings.get(encoding, codings.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(encoding, content, best=False):
+    if encoding == BROTLI:
+        return brotli.compress(content, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=9 if best else GZIP_LEVEL,
+                         mtime=0)
+
+
+def compress_stream(encoding, chunks):
+    """ Сжатие потока: каждый фрагмент отдаётся клиенту сразу после сжатия. """
+
+    if encoding == BROTLI:
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(
+        GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    Сжатие текстовых ответов в brotli (если установлен) или gzip по
+    заголовку Accept-Encoding. Ответы меньше COMPRESSION_MIN_SIZE байт
+    не сжимаются, потоковые ответы сжимаются по фрагментам.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_compressible(self, response):
+        if response.has_header('Content-Encoding'):
+            return False
+        if not response.get('Content-Type', '').startswith(
+                COMPRESSIBLE_TYPES):
+            return False
+        return (response.streaming
+                or len(response.content) >= settings.COMPRESSION_MIN_SIZE)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.is_compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                encoding, response.streaming_content)
+            del response['Content-Length']
+        else:
+            precompressed = getattr(response, PRECOMPRESSED_ATTR, None)
+            if precompressed is None:
+                content = compress(encoding, response.content)
+                if len(content) >= len(response.content):
+                    return response
+            else:
+                content = precompressed.get(encoding)
+                if content is None:
+                    content = precompressed[encoding] = compress(
+                        encoding, response.content, best=True)
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,50 @@
+from django.conf import settings
+
+from .routers import (get_replica_aliases, reset_read_from_replica,
+                      set_read_from_replica)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_primary_pin'
+PIN_SALT = 'foodgram.db.primary-pin'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик для безопасных запросов к API.
+
+    После успешной записи клиент на REPLICA_READ_YOUR_WRITES_WINDOW секунд
+    закрепляется за основной БД, чтобы сразу видеть свои изменения
+    (например, только что созданный рецепт), несмотря на отставание реплик.
+    Закрепление хранится в подписанной cookie, поэтому его видят все
+    процессы сервера.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.has_replicas = bool(get_replica_aliases())
+
+    def is_pinned(self, request):
+        return request.get_signed_cookie(
+            PIN_COOKIE, default=None, salt=PIN_SALT,
+            max_age=settings.REPLICA_READ_YOUR_WRITES_WINDOW) is not None
+
+    def __call__(self, request):
+        is_safe = (request.method in SAFE_METHODS
+                   or request.path in settings.REPLICA_READ_ONLY_PATHS)
+        use_replica = (
+            self.has_replicas
+            and is_safe
+            and request.path.startswith(settings.REPLICA_READ_PATH_PREFIX)
+            and not self.is_pinned(request)
+        )
+        token = set_read_from_replica(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_read_from_replica(token)
+        if self.has_replicas and not is_safe and response.status_code < 400:
+            response.set_signed_cookie(
+                PIN_COOKIE, '1', salt=PIN_SALT,
+                max_age=settings.REPLICA_READ_YOUR_WRITES_WINDOW,
+                secure=request.is_secure(), httponly=True, samesite='Lax')
+        return response
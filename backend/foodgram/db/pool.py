@@ -0,0 +1,154 @@
+import os
+import threading
+from functools import partial
+
+from django.db import DatabaseError
+
+POOL_EXHAUSTED_MSG = 'Пул соединений с БД "{alias}" исчерпан.'
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Пул открытых DB-API соединений одного процесса.
+
+    Соединения создаются по требованию, но не больше max_size одновременно;
+    при исчерпании пула ожидание ограничено timeout секундами.
+    """
+
+    def __init__(self, alias, max_size, timeout):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle = []
+        self.size = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, create, is_usable=None):
+        with self.condition:
+            while True:
+                if self.idle:
+                    connection = self.idle.pop()
+                    if is_usable is None or is_usable(connection):
+                        return connection
+                    self.size -= 1
+                    close_quietly(connection)
+                    continue
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                if not self.condition.wait(self.timeout):
+                    raise DatabaseError(
+                        POOL_EXHAUSTED_MSG.format(alias=self.alias))
+        try:
+            return create()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, connection):
+        try:
+            # Незавершённая транзакция не должна достаться следующему запросу.
+            connection.rollback()
+        except Exception:
+            close_quietly(connection)
+            connection = None
+        with self.condition:
+            if connection is None:
+                self.size -= 1
+            else:
+                self.idle.append(connection)
+            self.condition.notify()
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def get_pool(alias, max_size, timeout):
+    # Ключ включает pid: после fork пул родителя использовать нельзя.
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(
+                key, ConnectionPool(alias, max_size, timeout))
+    return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Дополнения к стандартному бэкенду БД:
+
+    - CONN_HEALTH_CHECKS: проверка переиспользуемого соединения перед первым
+      запросом в рамках HTTP-запроса (аналог одноимённой настройки
+      Django 4.1);
+    - POOL_SIZE: пул соединений процесса, в который закрываемые Django
+      соединения возвращаются вместо разрыва.
+    """
+
+    health_check_done = False
+
+    @property
+    def health_checks_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def get_pool(self):
+        max_size = self.settings_dict.get('POOL_SIZE', 0)
+        if not max_size:
+            return None
+        return get_pool(
+            self.alias, max_size, self.settings_dict.get('POOL_TIMEOUT', 30))
+
+    def is_connection_usable(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+        except self.Database.Error:
+            return False
+        return True
+
+    def get_new_connection(self, conn_params):
+        create = partial(super().get_new_connection, conn_params)
+        pool = self.get_pool()
+        if pool is None:
+            return create()
+        is_usable = None
+        if self.health_checks_enabled:
+            is_usable = self.is_connection_usable
+        return pool.acquire(create, is_usable)
+
+    def _close(self):
+        pool = self.get_pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            return pool.release(self.connection)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None
+                and self.health_checks_enabled
+                and not self.health_check_done
+                and not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
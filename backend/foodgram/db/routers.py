@@ -0,0 +1,67 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Токены и сессии читаются с основной БД: только что выданный токен
+# может ещё не доехать до реплики.
+PRIMARY_ONLY_APPS = ('authtoken', 'sessions')
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def get_replica_aliases():
+    return [alias for alias in settings.DATABASES
+            if alias.startswith(settings.REPLICA_ALIAS_PREFIX)]
+
+
+def set_read_from_replica(value):
+    return _read_from_replica.set(value)
+
+
+def reset_read_from_replica(token):
+    _read_from_replica.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Чтение в блоке с основной БД. Нужно при заполнении кешей с ключом по
+    версии данных: отстающая реплика сохранила бы прежние данные под
+    новой версией до следующего её сдвига.
+    """
+
+    token = set_read_from_replica(False)
+    try:
+        yield
+    finally:
+        reset_read_from_replica(token)
+
+
+class ReplicaRouter:
+    """
+    Направляет чтение на реплики, если текущий запрос это разрешил
+    (см. ReplicaRoutingMiddleware); запись и миграции - на основную БД.
+    """
+
+    def __init__(self):
+        self.replicas = get_replica_aliases()
+
+    def db_for_read(self, model, **hints):
+        if (not self.replicas
+                or not _read_from_replica.get()
+                or model._meta.app_label in PRIMARY_ONLY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
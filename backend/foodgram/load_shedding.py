@@ -0,0 +1,67 @@
+import threading
+import time
+
+from django.conf import settings
+from django.http import JsonResponse
+
+OVERLOADED_MSG = 'Сервер перегружен, повторите запрос позже.'
+# nginx передаёт время получения запроса: proxy_set_header X-Request-Start
+# "t=${msec}" (секунды с дробной частью).
+REQUEST_START_HEADER = 'HTTP_X_REQUEST_START'
+
+
+def get_queue_time(request):
+    """ Время ожидания запроса в очереди до воркера, в секундах. """
+
+    value = request.META.get(REQUEST_START_HEADER, '')
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return None
+    return max(time.time() - started, 0)
+
+
+class LoadSheddingMiddleware:
+    """
+    Отказ с 503 и Retry-After вместо обработки запроса, если он ждал
+    воркера дольше LOAD_SHED_MAX_QUEUE_TIME секунд (клиент, скорее всего,
+    уже не дождётся ответа) или процесс уже обрабатывает
+    LOAD_SHED_MAX_CONCURRENCY запросов. Нулевые значения отключают проверку.
+
+    Счётчик запросов свой у каждого процесса. Синхронный воркер gunicorn
+    обрабатывает по одному запросу, и счётчик не превышает 1: лимит
+    одновременных запросов работает с потоковыми воркерами (--threads) и
+    в ASGI (foodgram.asgi), а перед синхронными воркерами перегрузку
+    выявляет время в очереди.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def is_overloaded(self, request):
+        if settings.LOAD_SHED_MAX_QUEUE_TIME:
+            queue_time = get_queue_time(request)
+            if (queue_time is not None
+                    and queue_time > settings.LOAD_SHED_MAX_QUEUE_TIME):
+                return True
+        return bool(settings.LOAD_SHED_MAX_CONCURRENCY
+                    and self.in_flight > settings.LOAD_SHED_MAX_CONCURRENCY)
+
+    def __call__(self, request):
+        with self.lock:
+            self.in_flight += 1
+        try:
+            if self.is_overloaded(request):
+                response = JsonResponse(
+                    {'detail': OVERLOADED_MSG}, status=503,
+                    json_dumps_params={'ensure_ascii': False})
+                response['Retry-After'] = settings.LOAD_SHED_RETRY_AFTER
+                return response
+            return self.get_response(request)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
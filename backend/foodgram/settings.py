@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from dotenv import load_dotenv
 
@@ -31,7 +32,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.load_shedding.LoadSheddingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.compression.CompressionMiddleware',
+    'foodgram.db.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,19 +63,91 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
 
 
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
+        'ENGINE': os.getenv('DB_ENGINE', default='foodgram.db.postgresql'),
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True',
+        'POOL_SIZE': int(os.getenv('DB_POOL_SIZE', default=0)),
+        'POOL_TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', default=30)),
     }
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Общая тестовая БД SQLite в памяти не ждёт снятия блокировок таблиц,
+    # и тесты с параллельными запросами падают; файловая ждёт.
+    DATABASES['default']['TEST'] = {
+        'NAME': f"{DATABASES['default']['NAME']}.test"}
+
+REPLICA_ALIAS_PREFIX = 'replica_'
+REPLICA_READ_PATH_PREFIX = '/api/'
+# POST-запросы, которые только читают данные (пакет GET-подзапросов).
+REPLICA_READ_ONLY_PATHS = ('/api/batch/',)
+REPLICA_READ_YOUR_WRITES_WINDOW = int(
+    os.getenv('DB_REPLICA_READ_YOUR_WRITES_WINDOW', default=10))
+
+for setting, replica_values in (
+    ('HOST', os.getenv('DB_REPLICA_HOSTS', default='')),
+    ('NAME', os.getenv('DB_REPLICA_NAMES', default='')),
+):
+    for value in filter(None, replica_values.split(',')):
+        DATABASES[f'{REPLICA_ALIAS_PREFIX}{len(DATABASES)}'] = {
+            **DATABASES['default'],
+            setting: value.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['foodgram.db.routers.ReplicaRouter']
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+# Кеши, которые не видны другим процессам сервера.
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# Версии данных, по которым процессы сбрасывают свои кеши в памяти, должны
+# быть общими для всех процессов: если основной кеш локален для процесса,
+# они хранятся в файлах каталога, общего для процессов одного хоста.
+SHARED_CACHE = 'shared'
+if CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS:
+    CACHES[SHARED_CACHE] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv(
+            'SHARED_CACHE_DIR',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram-shared')),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+else:
+    CACHES[SHARED_CACHE] = CACHES['default']
+
+# Множества связей пользователей хранятся в основном кеше под общей
+# версией; в кеше процесса они живут недолго на случай изменений в обход
+# сигналов и менеджеров (update(), SQL).
+MEMBERSHIP_CACHE_TIMEOUT = int(os.getenv(
+    'MEMBERSHIP_CACHE_TIMEOUT',
+    default=30 if CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHE_BACKENDS
+    else 60 * 60))
+
+RECIPE_CHANGES_SETTLE_SECONDS = int(
+    os.getenv('RECIPE_CHANGES_SETTLE_SECONDS', default=5))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -108,11 +184,50 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Изображения моложе этого числа секунд не удаляются: при повторной
+# загрузке того же файла ссылающийся рецепт ещё может быть не сохранён.
+MEDIA_GC_MIN_AGE = int(os.getenv('MEDIA_GC_MIN_AGE', default=60 * 60))
+
+# Файлы, доступ к которым проверяет Django: stream - отдача самим Django,
+# x-accel-redirect - через internal-location nginx, x-sendfile.
+FILE_DELIVERY_BACKEND = os.getenv('FILE_DELIVERY_BACKEND', default='stream')
+PROTECTED_ROOT = os.getenv(
+    'PROTECTED_ROOT', default=os.path.join(BASE_DIR, 'protected'))
+PROTECTED_URL = '/protected/'
+
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', default=2))
+PDF_RENDER_QUEUE_SIZE = int(os.getenv('PDF_RENDER_QUEUE_SIZE', default=8))
+PDF_RENDER_RETRY_AFTER = int(os.getenv('PDF_RENDER_RETRY_AFTER', default=5))
+PDF_ASYNC_THRESHOLD = int(os.getenv('PDF_ASYNC_THRESHOLD', default=200))
+PDF_JOBS_DIR = os.getenv(
+    'PDF_JOBS_DIR', default=os.path.join(PROTECTED_ROOT, 'shopping_carts'))
+PDF_JOB_TTL = 60 * 60
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
 
+USE_FAST_JSON_RENDERER = (
+    os.getenv('USE_FAST_JSON_RENDERER', default='True') == 'True'
+)
+CACHE_REFERENCE_RESPONSES = (
+    os.getenv('CACHE_REFERENCE_RESPONSES', default='True') == 'True'
+)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=512))
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', default=10))
+
+# Псевдоним кеша для общего бюджета CostThrottle всех процессов; пустое
+# значение - корзины только в памяти процесса.
+THROTTLE_CACHE = os.getenv('THROTTLE_CACHE', default='')
+LOAD_SHED_MAX_QUEUE_TIME = float(
+    os.getenv('LOAD_SHED_MAX_QUEUE_TIME', default=0))
+# Число одновременных запросов процесса: больше одного бывает только с
+# потоками (gunicorn --threads) или в ASGI; синхронный воркер отсекается
+# только по LOAD_SHED_MAX_QUEUE_TIME.
+LOAD_SHED_MAX_CONCURRENCY = int(
+    os.getenv('LOAD_SHED_MAX_CONCURRENCY', default=0))
+LOAD_SHED_RETRY_AFTER = int(os.getenv('LOAD_SHED_RETRY_AFTER', default=5))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -121,12 +236,27 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer' if USE_FAST_JSON_RENDERER
+        else 'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_FILTER_BACKENDS': [
         "django_filters.rest_framework.DjangoFilterBackend",
-    ]
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.CostThrottle',
+        'api.throttling.EndpointCostThrottle',
+    ] if os.getenv('THROTTLING', default='False') == 'True' else [],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_RATE_ANON', default='300/min'),
+        'user': os.getenv('THROTTLE_RATE_USER', default='600/min'),
+        'endpoint': os.getenv('THROTTLE_RATE_ENDPOINT', default='240/min'),
+    },
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
 }
 
 DJOSER = {
@@ -0,0 +1,221 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe, Tag
+from users.models import User
+
+from .db.middleware import PIN_COOKIE, PIN_SALT
+from .db.routers import ReplicaRouter
+from .load_shedding import LoadSheddingMiddleware
+
+REPLICA_ALIAS = f'{settings.REPLICA_ALIAS_PREFIX}1'
+
+
+@skipUnless(connection.vendor == 'sqlite',
+            'Реплика создаётся копией файла тестовой БД SQLite.')
+class ReplicaTestCase(TransactionTestCase):
+    """
+    Реплика - копия тестовой БД на момент make_replica: записи после
+    копирования есть только на основной БД, как при отставании реплики.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            image='recipes/recipe.gif', cooking_time=10)
+
+    def make_replica(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        connection.connection.backup(replica)
+        replica.close()
+        settings.DATABASES[REPLICA_ALIAS] = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict, 'NAME': path}
+        self.addCleanup(settings.DATABASES.pop, REPLICA_ALIAS)
+        self.addCleanup(connections.__delitem__, REPLICA_ALIAS)
+        self.addCleanup(connections[REPLICA_ALIAS].close)
+        for db_router in router.routers:
+            if isinstance(db_router, ReplicaRouter):
+                replicas = mock.patch.object(
+                    db_router, 'replicas', [REPLICA_ALIAS])
+                replicas.start()
+                self.addCleanup(replicas.stop)
+
+    def get_client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+        return client
+
+
+class VersionedCacheFillTest(ReplicaTestCase):
+    """
+    Кеши с ключом по версии данных заполняются с основной БД: иначе
+    отстающая реплика оставила бы в них прежние данные под новой версией.
+    """
+
+    def test_memberships_read_from_primary(self):
+        self.make_replica()
+        Favorite.objects.add(self.author, self.recipe.id)
+        response = self.get_client(self.author).get('/api/recipes/')
+        self.assertTrue(response.json()['results'][0]['is_favorited'])
+
+    def test_reference_lists_read_from_primary(self):
+        self.make_replica()
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        response = self.get_client().get('/api/tags/')
+        self.assertEqual([tag['slug'] for tag in response.json()],
+                         ['breakfast'])
+
+
+class ReplicaRoutingTest(ReplicaTestCase):
+    """
+    Безопасные запросы к API читают с реплики; запись, токены и клиенты,
+    закреплённые cookie после своей записи, - с основной БД.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.make_replica()
+        # Есть только на основной БД.
+        self.new_recipe = Recipe.objects.create(
+            author=self.author, name='Новый рецепт', text='Описание',
+            image='recipes/recipe.gif', cooking_time=10)
+
+    def get_recipe_count(self, client):
+        response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['count']
+
+    def test_safe_api_reads_use_replica(self):
+        client = self.get_client()
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            self.assertEqual(self.get_recipe_count(client), 1)
+            self.assertEqual(client.get(
+                f'/api/recipes/{self.new_recipe.id}/').status_code, 404)
+        self.assertTrue(replica.captured_queries)
+
+    def test_writes_and_tokens_use_primary(self):
+        # Токен создан после копирования и есть только на основной БД.
+        client = self.get_client(self.author)
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            response = client.get('/api/users/me/')
+            self.assertEqual(response.status_code, 200)
+            response = client.post(
+                f'/api/recipes/{self.new_recipe.id}/favorite/')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica.captured_queries, [])
+        self.assertTrue(Favorite.objects.using(DEFAULT_DB_ALIAS).filter(
+            user=self.author, recipe=self.new_recipe).exists())
+
+    def test_write_pins_client_to_primary(self):
+        client = self.get_client(self.author)
+        response = client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.get_recipe_count(client), 2)
+        self.assertEqual(self.get_recipe_count(self.get_client()), 1)
+
+    def test_failed_write_does_not_pin(self):
+        client = self.get_client(self.author)
+        response = client.post('/api/recipes/0/favorite/')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_forged_and_expired_pins_ignored(self):
+        signer = signing.get_cookie_signer(salt=PIN_COOKIE + PIN_SALT)
+        expired_at = (
+            time.time() - settings.REPLICA_READ_YOUR_WRITES_WINDOW - 1)
+        with mock.patch('time.time', return_value=expired_at):
+            expired = signer.sign('1')
+        for value in ('1', f'1:{"x" * 6}:forged', expired):
+            with self.subTest(value=value):
+                client = self.get_client()
+                client.cookies[PIN_COOKIE] = value
+                self.assertEqual(self.get_recipe_count(client), 1)
+        client = self.get_client()
+        client.cookies[PIN_COOKIE] = signer.sign('1')
+        self.assertEqual(self.get_recipe_count(client), 2)
+
+
+class LoadSheddingTest(SimpleTestCase):
+    """
+    Запрос сверх LOAD_SHED_MAX_CONCURRENCY одновременных или ждавший
+    дольше LOAD_SHED_MAX_QUEUE_TIME получает 503 с Retry-After.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.nested_responses = []
+
+    def get_response(self, request):
+        # Вложенный вызов выполняется, пока внешний запрос ещё в работе.
+        if request.path == '/outer/':
+            self.nested_responses.append(
+                self.middleware(self.factory.get('/inner/')))
+        return HttpResponse()
+
+    def assert_overloaded(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+    @override_settings(LOAD_SHED_MAX_CONCURRENCY=1, LOAD_SHED_RETRY_AFTER=7)
+    def test_in_flight_limit(self):
+        self.middleware = LoadSheddingMiddleware(self.get_response)
+        response = self.middleware(self.factory.get('/outer/'))
+        self.assertEqual(response.status_code, 200)
+        self.assert_overloaded(self.nested_responses[0])
+        self.assertEqual(self.middleware.in_flight, 0)
+        response = self.middleware(self.factory.get('/inner/'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(LOAD_SHED_MAX_CONCURRENCY=2)
+    def test_in_flight_within_limit(self):
+        self.middleware = LoadSheddingMiddleware(self.get_response)
+        self.middleware(self.factory.get('/outer/'))
+        self.assertEqual(self.nested_responses[0].status_code, 200)
+
+    @override_settings(LOAD_SHED_MAX_CONCURRENCY=1)
+    def test_in_flight_released_on_error(self):
+        def get_response(request):
+            raise ValueError
+        middleware = LoadSheddingMiddleware(get_response)
+        with self.assertRaises(ValueError):
+            middleware(self.factory.get('/'))
+        self.assertEqual(middleware.in_flight, 0)
+
+    @override_settings(LOAD_SHED_MAX_QUEUE_TIME=1, LOAD_SHED_RETRY_AFTER=7)
+    def test_queue_time(self):
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+        now = time.time()
+        for started, status in ((now - 10, 503), (now, 200), ('x', 200)):
+            with self.subTest(started=started):
+                response = middleware(self.factory.get(
+                    '/', HTTP_X_REQUEST_START=f't={started}'))
+                self.assertEqual(response.status_code, status)
+                if status == 503:
+                    self.assert_overloaded(response)
@@ -1,14 +1,20 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.admin_tools import (EstimatedCountPaginator, MembershipAdminMixin,
+                               id_input_filter)
 
 from .models import (Ingredient, Favorite, Recipe, RecipeIngredient,
                      ShoppingCart, Tag)
+from .similarity import schedule_index_recipe
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'measurement_unit',)
-    search_fields = ('name',)
-    list_filter = ('name',)
+    search_fields = ('^name',)
+    list_filter = ('measurement_unit',)
     empty_value_display = '-пусто-'
 
 
@@ -35,26 +41,51 @@ class RecipeAdmin(admin.ModelAdmin):
         'text',
         'is_favorite',
     )
-    list_filter = ('name', 'author', 'tags',)
-    search_fields = ('name', 'author',)
+    list_filter = ('tags', id_input_filter('author', 'id автора'),)
+    list_select_related = ('author',)
+    search_fields = ('^name', '=author__username',)
+    autocomplete_fields = ('author',)
     inlines = (RecipeIngridientInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        # Подзапрос вычисляется только для рецептов текущей страницы.
+        favorites_count = Favorite.objects.filter(
+            recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+                count=Count('id')).values('count')
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(Subquery(favorites_count), 0))
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        schedule_index_recipe(form.instance.id)
+
+    @admin.display(description='В избранном')
     def is_favorite(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
 
-@admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class UserRecipeAdmin(MembershipAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe',)
-    list_filter = ('user',)
-    search_fields = ('user',)
+    list_filter = (
+        id_input_filter('user', 'id пользователя'),
+        id_input_filter('recipe', 'id рецепта'),
+    )
+    list_select_related = ('user', 'recipe')
+    search_fields = ('=user__username',)
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
+@admin.register(Favorite)
+class FavoriteAdmin(UserRecipeAdmin):
+    pass
+
+
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'recipe',)
-    list_filter = ('user',)
-    search_fields = ('user',)
-    empty_value_display = '-пусто-'
+class ShoppingCartAdmin(UserRecipeAdmin):
+    pass
@@ -3,6 +3,7 @@ import csv
 from django.core.management.base import BaseCommand
 
 from recipes.models import Ingredient
+from recipes.versioning import bump_data_version
 
 
 SUCCESS_MSG = 'Ингредиенты выгружены.'
@@ -14,11 +15,15 @@ class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
         try:
+            existing = set(Ingredient.objects.values_list(
+                'name', 'measurement_unit'))
             with open('data/ingredients.csv', 'r', encoding='UTF-8') as file:
-                for row in csv.reader(file):
-                    Ingredient.objects.get_or_create(
-                        name=row[0], measurement_unit=row[1],
-                    )
+                rows = {(row[0], row[1]) for row in csv.reader(file)}
+            Ingredient.objects.bulk_create(
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in sorted(rows - existing)
+            )
+            bump_data_version(Ingredient)
             self.stdout.write(self.style.SUCCESS(SUCCESS_MSG))
         except Exception:
             self.stdout.write(self.style.ERROR(FAILURE_MSG))
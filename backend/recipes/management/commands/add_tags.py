@@ -3,6 +3,7 @@ import csv
 from django.core.management.base import BaseCommand
 
 from recipes.models import Tag
+from recipes.versioning import bump_data_version
 
 SUCCESS_MSG = 'Тэги выгружены.'
 FAILURE_MSG = 'Выгрузка тэгов прошла неудачно.'
@@ -18,6 +19,7 @@ class Command(BaseCommand):
                     Tag.objects.get_or_create(
                         name=row[0], color=row[1], slug=row[2]
                     )
+            bump_data_version(Tag)
             self.stdout.write(self.style.SUCCESS(SUCCESS_MSG))
         except Exception:
             self.stdout.write(self.style.ERROR(FAILURE_MSG))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import REBUILD_BATCH_SIZE, rebuild_index
+
+SUCCESS_MSG = 'Индекс похожих рецептов перестроен: {count} рецептов.'
+
+
+class Command(BaseCommand):
+    help = 'Перестроение MinHash/LSH-индекса похожих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(SUCCESS_MSG.format(count=count)))
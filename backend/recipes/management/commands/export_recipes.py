@@ -0,0 +1,54 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from recipes.models import Recipe
+from recipes.transfer import RECIPE_TYPE, get_recipe_records
+from users.models import User
+
+SUCCESS_MSG = 'Выгружено рецептов: {count} за {seconds:.1f} с ({rate:.0f}/с).'
+UNKNOWN_AUTHOR_MSG = 'Пользователь {username} не найден.'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузка рецептов в NDJSON: по записи {"type": "recipe", "data": '
+        '...} в строке, изображения - имена файлов в хранилище'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл выгрузки, "-" - стандартный вывод')
+        parser.add_argument('--author', help='Только рецепты пользователя')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    UNKNOWN_AUTHOR_MSG.format(username=options['author']))
+            recipes = recipes.filter(author=author)
+        output = (sys.stdout if options['path'] == '-'
+                  else open(options['path'], 'w', encoding='UTF-8'))
+        started = time.perf_counter()
+        count = 0
+        try:
+            for recipe in get_recipe_records(recipes, lambda name: name):
+                output.write(json.dumps(
+                    {'type': RECIPE_TYPE, 'data': recipe},
+                    cls=DjangoJSONEncoder, ensure_ascii=False))
+                output.write('\n')
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        seconds = time.perf_counter() - started
+        # Отчёт - в stderr, чтобы не смешиваться с выгрузкой в stdout.
+        self.stderr.write(self.style.SUCCESS(SUCCESS_MSG.format(
+            count=count, seconds=seconds,
+            rate=count / seconds if seconds else 0
+        )))
@@ -0,0 +1,100 @@
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+from recipes.storage import image_storage
+from recipes.transfer import chunked
+
+SUCCESS_MSG = (
+    'Просмотрено файлов: {scanned}, {action}: {removed} '
+    '({size:.1f} МБ).'
+)
+RESUME_MSG = 'Достигнут --limit; продолжить: --start-after {name}'
+IMAGES_DIR = Recipe._meta.get_field('image').upload_to.rstrip('/')
+
+
+def iter_files(storage, directory, start_after=''):
+    """
+    Файлы каталога хранилища по возрастанию имени, по одному каталогу
+    за раз: список файлов всего хранилища в памяти не собирается.
+    """
+
+    directories, files = storage.listdir(directory)
+    # Каталоги сортируются с завершающим "/", чтобы порядок совпадал с
+    # порядком полных имён файлов, по которому продолжается проход.
+    entries = sorted(
+        [(posixpath.join(directory, name) + '/', True)
+         for name in directories]
+        + [(posixpath.join(directory, name), False) for name in files]
+    )
+    for path, is_directory in entries:
+        if not is_directory:
+            if path > start_after:
+                yield path
+        elif path > start_after or start_after.startswith(path):
+            yield from iter_files(storage, path[:-1], start_after)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаление изображений рецептов, на которые не ссылается ни один '
+        'рецепт. Хранилище просматривается пачками, проход можно '
+        'прервать и продолжить с --start-after'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только вывести файлы, не удаляя их')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=settings.MEDIA_GC_MIN_AGE,
+            help='Не трогать файлы моложе этого числа секунд: они могут '
+                 'принадлежать ещё не сохранённым рецептам')
+        parser.add_argument('--limit', type=int, default=0,
+                            help='Просмотреть не больше файлов за запуск')
+        parser.add_argument('--start-after', default='',
+                            help='Продолжить проход после этого файла')
+
+    def collect_batch(self, names, options, stats):
+        referenced = set(Recipe.objects.filter(
+            image__in=names).values_list('image', flat=True))
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        for name in names:
+            if name in referenced:
+                continue
+            if image_storage.get_modified_time(name) > threshold:
+                continue
+            stats['size'] += image_storage.size(name)
+            stats['removed'] += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                image_storage.delete(name)
+
+    def handle(self, *args, **options):
+        stats = {'scanned': 0, 'removed': 0, 'size': 0}
+        if not image_storage.exists(IMAGES_DIR):
+            files = iter(())
+        else:
+            files = iter_files(
+                image_storage, IMAGES_DIR, options['start_after'])
+        last_name = None
+        for names in chunked(files, options['batch_size']):
+            if options['limit']:
+                names = names[:options['limit'] - stats['scanned']]
+            self.collect_batch(names, options, stats)
+            stats['scanned'] += len(names)
+            last_name = names[-1]
+            if options['limit'] and stats['scanned'] >= options['limit']:
+                self.stdout.write(RESUME_MSG.format(name=last_name))
+                break
+        self.stdout.write(self.style.SUCCESS(SUCCESS_MSG.format(
+            scanned=stats['scanned'],
+            action='к удалению' if options['dry_run'] else 'удалено',
+            removed=stats['removed'],
+            size=stats['size'] / 1024 / 1024,
+        )))
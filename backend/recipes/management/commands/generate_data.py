@@ -0,0 +1,192 @@
+import csv
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.versioning import bump_data_version
+from users.models import Subscription, User
+
+SUCCESS_MSG = 'Синтетические данные сгенерированы.'
+USERNAME_PREFIX = 'synthetic_'
+IMAGE_NAME = 'recipes/synthetic.gif'
+# Прозрачный GIF 1x1: рецепту нужна картинка, но её содержимое не важно.
+IMAGE_CONTENT = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9'
+    b'\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02D\x01\x00;'
+)
+BATCH_SIZE = 1000
+
+
+def zipf_weights(size, skew):
+    """ Веса для выбора с перекосом: первые элементы популярнее. """
+
+    return [1 / (rank ** skew) for rank in range(1, size + 1)]
+
+
+class Command(BaseCommand):
+    help = 'Генерация синтетических данных для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных на пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--subscriptions', type=int, default=5,
+                            help='Среднее число подписок на пользователя')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Показатель распределения Ципфа')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить ранее сгенерированные данные')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        if options['clear']:
+            User.objects.filter(
+                username__startswith=USERNAME_PREFIX).delete()
+        self.load_reference_data()
+        if not default_storage.exists(IMAGE_NAME):
+            default_storage.save(IMAGE_NAME, ContentFile(IMAGE_CONTENT))
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(rnd, users, options)
+            self.create_relations(rnd, users, recipes, options)
+        self.stdout.write(self.style.SUCCESS(SUCCESS_MSG))
+
+    def load_reference_data(self):
+        if not Tag.objects.exists():
+            with open('data/tags.csv', 'r', encoding='UTF-8') as file:
+                Tag.objects.bulk_create(
+                    Tag(name=row[0], color=row[1], slug=row[2])
+                    for row in csv.reader(file)
+                )
+            bump_data_version(Tag)
+        if not Ingredient.objects.exists():
+            with open('data/ingredients.csv', 'r', encoding='UTF-8') as file:
+                Ingredient.objects.bulk_create(
+                    (Ingredient(name=row[0], measurement_unit=row[1])
+                     for row in csv.reader(file)),
+                    batch_size=BATCH_SIZE
+                )
+            bump_data_version(Ingredient)
+
+    def create_users(self, count):
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).count()
+        password = make_password('synthetic-password')
+        User.objects.bulk_create(
+            (User(
+                username=f'{USERNAME_PREFIX}{number}',
+                email=f'{USERNAME_PREFIX}{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            ) for number in range(start, start + count)),
+            batch_size=BATCH_SIZE
+        )
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, rnd, users, options):
+        count = options['recipes']
+        author_weights = zipf_weights(len(users), options['skew'])
+        authors = rnd.choices(users, weights=author_weights, k=count)
+        created = Recipe.objects.bulk_create(
+            (Recipe(
+                author_id=author_id,
+                name=f'Рецепт {number}',
+                text='Синтетическое описание рецепта. ' * 10,
+                image=IMAGE_NAME,
+                cooking_time=rnd.randint(5, 180),
+            ) for number, author_id in enumerate(authors)),
+            batch_size=BATCH_SIZE
+        )
+        if created and created[0].pk is not None:
+            recipe_ids = [recipe.pk for recipe in created]
+        else:
+            recipe_ids = list(Recipe.objects.filter(
+                author_id__in=users
+            ).order_by('-id').values_list('id', flat=True)[:count])
+
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        ingredient_weights = zipf_weights(
+            len(ingredient_ids), options['skew'])
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        per_recipe = min(options['ingredients_per_recipe'],
+                         len(ingredient_ids))
+        tags_per_recipe = min(options['tags_per_recipe'], len(tag_ids))
+        recipe_ingredients = []
+        recipe_tags = []
+        for recipe_id in recipe_ids:
+            chosen = set()
+            while len(chosen) < per_recipe:
+                chosen.update(rnd.choices(
+                    ingredient_ids, weights=ingredient_weights,
+                    k=per_recipe - len(chosen)))
+            recipe_ingredients.extend(
+                RecipeIngredient(recipe_id=recipe_id, ingredient_id=item,
+                                 amount=rnd.randint(1, 500))
+                for item in chosen
+            )
+            recipe_tags.extend(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in rnd.sample(tag_ids, tags_per_recipe)
+            )
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=BATCH_SIZE)
+        Recipe.tags.through.objects.bulk_create(
+            recipe_tags, batch_size=BATCH_SIZE)
+        return recipe_ids
+
+    def sample_skewed(self, rnd, population, weights, mean):
+        if not population or mean <= 0:
+            return set()
+        size = min(len(population), int(rnd.expovariate(1 / mean)))
+        chosen = set()
+        for _ in range(size * 3):
+            if len(chosen) >= size:
+                break
+            chosen.add(rnd.choices(population, weights=weights)[0])
+        return chosen
+
+    def create_relations(self, rnd, users, recipes, options):
+        recipe_weights = zipf_weights(len(recipes), options['skew'])
+        author_weights = zipf_weights(len(users), options['skew'])
+        favorites = []
+        carts = []
+        subscriptions = []
+        for user_id in users:
+            favorites.extend(
+                Favorite(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in self.sample_skewed(
+                    rnd, recipes, recipe_weights, options['favorites'])
+            )
+            carts.extend(
+                ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in self.sample_skewed(
+                    rnd, recipes, recipe_weights, options['carts'])
+            )
+            subscriptions.extend(
+                Subscription(user_id=user_id, author_id=author_id)
+                for author_id in self.sample_skewed(
+                    rnd, users, author_weights, options['subscriptions'])
+                if author_id != user_id
+            )
+        Favorite.objects.bulk_create(
+            favorites, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        ShoppingCart.objects.bulk_create(
+            carts, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        Subscription.objects.bulk_create(
+            subscriptions, batch_size=BATCH_SIZE, ignore_conflicts=True)
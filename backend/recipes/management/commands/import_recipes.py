@@ -0,0 +1,96 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import (CHUNK_SIZE, INVALID_RECORD_MSG, RECIPE_TYPE,
+                              RecipeImporter, chunked)
+from users.models import User
+
+SUCCESS_MSG = (
+    'Загружено рецептов: {count}, пропущено записей: {skipped} '
+    'за {seconds:.1f} с ({rate:.0f}/с).'
+)
+PROGRESS_MSG = 'Загружено {count} рецептов ({rate:.0f}/с)'
+ERROR_MSG = 'Запись {number}: {error}'
+INVALID_JSON_MSG = 'Некорректный JSON.'
+UNKNOWN_AUTHOR_MSG = 'Пользователь {username} не найден.'
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка рецептов из NDJSON (формат export_recipes и выгрузки '
+        'аккаунта) пачками с bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл выгрузки, "-" - стандартный ввод')
+        parser.add_argument(
+            '--author',
+            help='Автор записей без поля author (выгрузка аккаунта)')
+        parser.add_argument(
+            '--images',
+            help='Каталог, относительно которого указаны изображения '
+                 'записей (MEDIA_ROOT источника или распакованный архив); '
+                 'без него изображения должны быть в хранилище')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def read_records(self, lines, errors):
+        """ Пары (номер строки, запись рецепта), прочие типы пропускаются. """
+
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                errors.append((number, INVALID_JSON_MSG))
+                continue
+            if isinstance(record, dict) and 'type' in record:
+                if record['type'] != RECIPE_TYPE:
+                    continue
+                record = record.get('data')
+            if not isinstance(record, dict):
+                errors.append((number, INVALID_RECORD_MSG))
+                continue
+            yield number, record
+
+    def get_author(self, username):
+        if not username:
+            return None
+        author = User.objects.filter(username=username).first()
+        if author is None:
+            raise CommandError(UNKNOWN_AUTHOR_MSG.format(username=username))
+        return author
+
+    def handle(self, *args, **options):
+        importer = RecipeImporter(
+            default_author=self.get_author(options['author']),
+            images_dir=options['images'])
+        source = (sys.stdin if options['path'] == '-'
+                  else open(options['path'], encoding='UTF-8'))
+        started = time.perf_counter()
+        count = 0
+        errors = []
+        try:
+            for chunk in chunked(self.read_records(source, errors),
+                                 options['chunk_size']):
+                loaded, chunk_errors = importer.import_chunk(chunk)
+                count += loaded
+                errors.extend(chunk_errors)
+                if options['verbosity'] > 1:
+                    self.stdout.write(PROGRESS_MSG.format(
+                        count=count,
+                        rate=count / (time.perf_counter() - started)))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        seconds = time.perf_counter() - started
+        for number, error in sorted(errors):
+            self.stderr.write(ERROR_MSG.format(number=number, error=error))
+        self.stdout.write(self.style.SUCCESS(SUCCESS_MSG.format(
+            count=count, skipped=len(errors), seconds=seconds,
+            rate=count / seconds if seconds else 0
+        )))
@@ -0,0 +1,86 @@
+from django.db import connections, models, router
+
+from .memberships import invalidate_memberships
+
+INSERT_IGNORE_SQL = (
+    'INSERT INTO {table} ({user}, {recipe}) '
+    'SELECT %s, {recipe_pk} FROM {recipe_table} WHERE {recipe_pk} = %s '
+    'ON CONFLICT DO NOTHING RETURNING {recipe}'
+)
+
+
+class UserRecipeQuerySet(models.QuerySet):
+    """
+    Операции над связями пользователь-рецепт (избранное, список покупок)
+    одним SQL-запросом без предварительной проверки существования, поэтому
+    параллельные запросы не приводят к IntegrityError.
+    """
+
+    def add(self, user, recipe_id):
+        """
+        Добавляет связь и возвращает True, если она была создана; False,
+        если связь уже есть или рецепта не существует.
+        """
+
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        opts = self.model._meta
+        recipe_field = opts.get_field('recipe')
+        recipe_opts = recipe_field.related_model._meta
+        sql = INSERT_IGNORE_SQL.format(
+            table=quote_name(opts.db_table),
+            user=quote_name(opts.get_field('user').column),
+            recipe=quote_name(recipe_field.column),
+            recipe_table=quote_name(recipe_opts.db_table),
+            recipe_pk=quote_name(recipe_opts.pk.column),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [user.pk, recipe_id])
+            created = cursor.fetchone() is not None
+        if created:
+            invalidate_memberships(self.model, user.pk)
+        return created
+
+    def remove(self, user, recipe_id):
+        """ Удаляет связь и возвращает True, если она существовала. """
+
+        deleted, _ = self.filter(user=user, recipe_id=recipe_id).delete()
+        if deleted:
+            invalidate_memberships(self.model, user.pk)
+        return deleted > 0
+
+    def add_many(self, user, recipe_ids):
+        """
+        Добавляет связи с рецептами одним INSERT и возвращает множество
+        id рецептов, которые уже были связаны с пользователем.
+        """
+
+        existing = self.get_recipe_ids(user, recipe_ids)
+        self.bulk_create(
+            [self.model(user=user, recipe_id=recipe_id)
+             for recipe_id in recipe_ids if recipe_id not in existing],
+            ignore_conflicts=True
+        )
+        invalidate_memberships(self.model, user.pk)
+        return existing
+
+    def remove_many(self, user, recipe_ids=None):
+        """
+        Удаляет связи с рецептами (все, если recipe_ids не передан) одним
+        DELETE и возвращает множество id рецептов, которые были связаны.
+        """
+
+        queryset = self.filter(user=user)
+        existing = None
+        if recipe_ids is not None:
+            existing = self.get_recipe_ids(user, recipe_ids)
+            queryset = queryset.filter(recipe_id__in=existing)
+        queryset.delete()
+        invalidate_memberships(self.model, user.pk)
+        return existing
+
+    def get_recipe_ids(self, user, recipe_ids):
+        return set(self.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
@@ -0,0 +1,66 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .versioning import bump_version, get_version
+
+# Модель связи пользователя -> поле с id связанного объекта.
+MEMBERSHIP_FIELDS = {
+    'recipes.favorite': 'recipe_id',
+    'recipes.shoppingcart': 'recipe_id',
+    'users.subscription': 'author_id',
+}
+MEMBERSHIP_KEY = 'memberships:{label}:{user_id}:{version}'
+REQUEST_CACHE_ATTR = '_memberships'
+
+
+def get_version_name(model, user_id):
+    return f'memberships:{model._meta.label_lower}:{user_id}'
+
+
+def load_memberships(model, user_id):
+    label = model._meta.label_lower
+    field = MEMBERSHIP_FIELDS[label]
+    key = MEMBERSHIP_KEY.format(
+        label=label, user_id=user_id,
+        version=get_version(get_version_name(model, user_id)))
+    ids = cache.get(key)
+    if ids is None:
+        # С основной БД: множество с реплики, не получившей последнего
+        # изменения, осталось бы в кеше под новой версией.
+        ids = frozenset(apps.get_model(label).objects.using(
+            DEFAULT_DB_ALIAS).filter(
+                user_id=user_id).values_list(field, flat=True))
+        cache.set(key, ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return ids
+
+
+def get_memberships(request, model):
+    """
+    Множество id рецептов в избранном или списке покупок либо id авторов,
+    на которых подписан текущий пользователь. Хранится в кеше Django,
+    в рамках запроса запоминается на объекте request.
+    """
+
+    user = getattr(request, 'user', None)
+    if user is None or user.is_anonymous:
+        return frozenset()
+    memo = getattr(request, REQUEST_CACHE_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(request, REQUEST_CACHE_ATTR, memo)
+    if model not in memo:
+        memo[model] = load_memberships(model, user.id)
+    return memo[model]
+
+
+def invalidate_memberships(model, user_id):
+    """
+    Сброс закешированного множества после изменения связей. Версия
+    сдвигается после фиксации транзакции: иначе другой процесс может
+    закешировать прежнее множество уже под новой версией.
+    """
+
+    transaction.on_commit(
+        lambda: bump_version(get_version_name(model, user_id)))
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.10 on 2026-10-19 08:06
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_added_at(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(updated_at=F('added_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.PositiveIntegerField(verbose_name='id удалённого рецепта')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления рецепта')),
+            ],
+            options={
+                'verbose_name': 'Удалённый рецепт',
+                'verbose_name_plural': 'Удалённые рецепты',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения рецепта'),
+        ),
+        migrations.RunPython(copy_added_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at', 'id'], name='recipe_updated_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_at_id_idx'),
+        ),
+    ]
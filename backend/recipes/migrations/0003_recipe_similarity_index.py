@@ -0,0 +1,46 @@
+# Generated by Django 3.2.10 on 2026-10-19 08:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_updated_at_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSignature',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('signature', models.BinaryField(verbose_name='MinHash-подпись рецепта')),
+            ],
+            options={
+                'verbose_name': 'Подпись рецепта',
+                'verbose_name_plural': 'Подписи рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Номер полосы LSH')),
+                ('bucket', models.BigIntegerField(verbose_name='Хеш полосы LSH')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Корзина LSH рецепта',
+                'verbose_name_plural': 'Корзины LSH рецептов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipebucket',
+            index=models.Index(fields=['band', 'bucket'], name='recipe_bucket_band_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipebucket',
+            constraint=models.UniqueConstraint(fields=('recipe', 'band'), name='unique_recipe_band'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.10 on 2026-10-19 08:31
+
+from django.db import migrations, models
+
+# Поиск ингредиентов по началу названия (name__istartswith) строит
+# UPPER("name") LIKE UPPER('...%'); в PostgreSQL такой запрос использует
+# только индекс по UPPER("name") с классом операторов varchar_pattern_ops.
+INGREDIENT_NAME_INDEX = 'recipes_ingredient_upper_name_like'
+
+
+def create_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX} '
+        'ON recipes_ingredient (UPPER(name) varchar_pattern_ops)'
+    )
+
+
+def drop_ingredient_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_similarity_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-added_at', 'id'], name='recipe_added_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-added_at'], name='recipe_author_added_at_idx'),
+        ),
+        migrations.RunPython(
+            create_ingredient_name_index, drop_ingredient_name_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.10 on 2026-10-19 08:51
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.get_image_storage, upload_to='recipes/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+import hashlib
+import random
+from array import array
+from collections import defaultdict
+
+from django.db import migrations
+
+# Копия построения индекса из recipes/similarity.py на момент миграции:
+# миграция не должна меняться вместе с модулем. Если константы или
+# хеширование в модуле изменятся, индекс перестраивается командой
+# build_similarity_index.
+NUM_PERM = 64
+ROWS = 3
+BANDS = NUM_PERM // ROWS
+HASH_SEED = 20221001
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+BATCH_SIZE = 1000
+
+
+def get_permutations():
+    rnd = random.Random(HASH_SEED)
+    return tuple(
+        (rnd.randrange(1, MERSENNE_PRIME), rnd.randrange(0, MERSENNE_PRIME))
+        for _ in range(NUM_PERM)
+    )
+
+
+def get_features(apps, recipe_ids):
+    recipe_ingredient = apps.get_model('recipes', 'RecipeIngredient')
+    recipe_tag = apps.get_model('recipes', 'Recipe').tags.through
+    features = defaultdict(set)
+    for recipe_id, ingredient_id in recipe_ingredient.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id'):
+        features[recipe_id].add(ingredient_id * 2)
+    for recipe_id, tag_id in recipe_tag.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe_id', 'tag_id'):
+        features[recipe_id].add(tag_id * 2 + 1)
+    return features
+
+
+def get_signature(permutations, features):
+    return array('I', (
+        min((a * feature + b) % MERSENNE_PRIME & MAX_HASH
+            for feature in features)
+        for a, b in permutations
+    ))
+
+
+def get_buckets(signature):
+    return [
+        (band, int.from_bytes(hashlib.blake2b(
+            signature[band * ROWS:(band + 1) * ROWS].tobytes(),
+            digest_size=8).digest(), 'big', signed=True))
+        for band in range(BANDS)
+    ]
+
+
+def build_similarity_index(apps, schema_editor):
+    # Рецепты, созданные до появления индекса, иначе не находятся
+    # в похожих, пока их не пересохранят.
+    recipe_model = apps.get_model('recipes', 'Recipe')
+    signature_model = apps.get_model('recipes', 'RecipeSignature')
+    bucket_model = apps.get_model('recipes', 'RecipeBucket')
+    permutations = get_permutations()
+    bucket_model.objects.all().delete()
+    signature_model.objects.all().delete()
+    last_id = 0
+    while True:
+        recipe_ids = list(recipe_model.objects.filter(
+            id__gt=last_id
+        ).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not recipe_ids:
+            return
+        signatures = []
+        buckets = []
+        for recipe_id, features in get_features(apps, recipe_ids).items():
+            signature = get_signature(permutations, features)
+            signatures.append(signature_model(
+                recipe_id=recipe_id, signature=signature.tobytes()))
+            buckets.extend(
+                bucket_model(recipe_id=recipe_id, band=band, bucket=bucket)
+                for band, bucket in get_buckets(signature)
+            )
+        signature_model.objects.bulk_create(signatures)
+        bucket_model.objects.bulk_create(buckets)
+        last_id = recipe_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            build_similarity_index, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,9 @@ from django.db import models
 
 from users.models import User
 
+from .managers import UserRecipeQuerySet
+from .storage import get_image_storage
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -64,7 +67,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name='Изображение',
-        upload_to='recipes/'
+        upload_to='recipes/',
+        storage=get_image_storage
     )
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -84,16 +88,94 @@ class Recipe(models.Model):
         verbose_name='Дата добавления рецепта',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения рецепта',
+        auto_now=True
+    )
 
     class Meta:
         ordering = ('-added_at',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'],
+                         name='recipe_updated_at_id_idx'),
+            models.Index(fields=['-added_at', 'id'],
+                         name='recipe_added_at_id_idx'),
+            models.Index(fields=['author', '-added_at'],
+                         name='recipe_author_added_at_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
 
 
+class RecipeTombstone(models.Model):
+
+    recipe_id = models.PositiveIntegerField(
+        verbose_name='id удалённого рецепта'
+    )
+    deleted_at = models.DateTimeField(
+        verbose_name='Дата удаления рецепта',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'],
+                         name='tombstone_deleted_at_id_idx')
+        ]
+
+    def __str__(self) -> str:
+        return f'Удалённый рецепт {self.recipe_id}'
+
+
+class RecipeSignature(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт'
+    )
+    signature = models.BinaryField(verbose_name='MinHash-подпись рецепта')
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self) -> str:
+        return f'Подпись рецепта {self.recipe_id}'
+
+
+class RecipeBucket(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='buckets',
+        verbose_name='Рецепт'
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Номер полосы LSH')
+    bucket = models.BigIntegerField(verbose_name='Хеш полосы LSH')
+
+    class Meta:
+        verbose_name = 'Корзина LSH рецепта'
+        verbose_name_plural = 'Корзины LSH рецептов'
+        indexes = [
+            models.Index(fields=['band', 'bucket'],
+                         name='recipe_bucket_band_bucket_idx')
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'band'],
+                                    name='unique_recipe_band')
+        ]
+
+    def __str__(self) -> str:
+        return f'Рецепт {self.recipe_id}: полоса {self.band}'
+
+
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -136,6 +218,8 @@ class Favorite(models.Model):
         related_name='favorite'
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Список избранного'
         verbose_name_plural = 'Список избранного'
@@ -160,6 +244,8 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт в списке покупок'
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
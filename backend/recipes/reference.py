@@ -0,0 +1,119 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Ingredient, Tag
+from .versioning import get_data_version
+
+IngredientData = namedtuple('IngredientData', ('name', 'measurement_unit'))
+TagData = namedtuple('TagData', ('name', 'color', 'slug'))
+
+
+def from_primary(model):
+    return model.objects.using(DEFAULT_DB_ALIAS)
+
+
+class ReferenceData:
+    """
+    Неизменяемый снимок справочников: ингредиенты (id -> название и
+    единица измерения) и тэги (id -> данные тэга, slug -> id). Читается
+    с основной БД: снимок с отстающей реплики остался бы под новой
+    версией данных.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        # Снимок устарел: в нём не нашлось id из БД (справочник изменили
+        # в обход сигналов и команд). Следующий запрос загрузит новый.
+        self.stale = False
+        self.ingredients = MappingProxyType({
+            id: IngredientData(name, unit)
+            for id, name, unit in from_primary(Ingredient).values_list(
+                'id', 'name', 'measurement_unit')
+        })
+        tags = {
+            id: TagData(name, color, slug)
+            for id, name, color, slug in from_primary(Tag).values_list(
+                'id', 'name', 'color', 'slug')
+        }
+        self.tags = MappingProxyType(tags)
+        self.tag_ids_by_slug = MappingProxyType(
+            {tag.slug: id for id, tag in tags.items()})
+
+    def get_ingredient(self, ingredient_id):
+        ingredient = self.ingredients.get(ingredient_id)
+        if ingredient is None:
+            self.stale = True
+            ingredient = IngredientData(*from_primary(Ingredient).values_list(
+                'name', 'measurement_unit').get(id=ingredient_id))
+        return ingredient
+
+    def get_tag(self, tag_id):
+        tag = self.tags.get(tag_id)
+        if tag is None:
+            self.stale = True
+            tag = TagData(*from_primary(Tag).values_list(
+                'name', 'color', 'slug').get(id=tag_id))
+        return tag
+
+    def find_unknown_ingredients(self, ingredient_ids):
+        """ id ингредиентов, которых нет ни в снимке, ни в БД. """
+
+        missing = set(ingredient_ids) - self.ingredients.keys()
+        if missing:
+            found = set(from_primary(Ingredient).filter(
+                id__in=missing).values_list('id', flat=True))
+            self.stale = self.stale or bool(found)
+            missing -= found
+        return missing
+
+    def tag_exists(self, tag_id):
+        if tag_id in self.tags:
+            return True
+        if from_primary(Tag).filter(id=tag_id).exists():
+            self.stale = True
+            return True
+        return False
+
+    def ingredient_to_representation(self, ingredient_id, amount):
+        ingredient = self.get_ingredient(ingredient_id)
+        return {
+            'id': ingredient_id,
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+            'amount': amount,
+        }
+
+    def tags_to_representation(self, tag_ids):
+        tags = {id: self.get_tag(id) for id in tag_ids}
+        return [
+            {'id': id, **tags[id]._asdict()}
+            for id in sorted(tag_ids, key=lambda id: tags[id].name)
+        ]
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_reference_data():
+    """
+    Снимок справочников текущего процесса. Загружается при первом
+    обращении и перезагружается, когда сигналы сохранения/удаления
+    или команды загрузки сдвигают версию данных Ingredient или Tag, а
+    также после промаха по снимку. Отсутствующие в снимке id проверяются
+    по БД, поэтому устаревший снимок не отклоняет существующие записи.
+    """
+
+    global _snapshot
+    version = (get_data_version(Ingredient), get_data_version(Tag))
+    snapshot = _snapshot
+    if snapshot is None or snapshot.stale or snapshot.version != version:
+        with _snapshot_lock:
+            snapshot = _snapshot
+            if (snapshot is None or snapshot.stale
+                    or snapshot.version != version):
+                snapshot = _snapshot = ReferenceData(version)
+    return snapshot
@@ -0,0 +1,85 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Subscription
+
+from .memberships import invalidate_memberships
+from .models import (Favorite, Ingredient, Recipe, RecipeTombstone,
+                     ShoppingCart, Tag)
+from .storage import schedule_image_cleanup
+from .versioning import bump_data_version
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_reference_data_version(sender, **kwargs):
+    bump_data_version(sender)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created=False, **kwargs):
+    """
+    Рецепты содержат данные ингредиента, поэтому его изменение или
+    удаление - изменение этих рецептов для синхронизации.
+    """
+
+    if not created:
+        Recipe.objects.filter(recipe__ingredient=instance).update(
+            updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_tag_recipes(sender, instance, created=False, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).update(
+            updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def invalidate_user_memberships(sender, instance, **kwargs):
+    """
+    Создание и изменение через save (админка, shell, сериализаторы).
+    На удаление сигнала нет: post_delete отключил бы быстрое удаление
+    одним DELETE. Удаления сбрасывают кеш явно (менеджеры, вьюхи,
+    админка), каскадные - по истечении MEMBERSHIP_CACHE_TIMEOUT.
+    """
+
+    invalidate_memberships(sender, instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def create_recipe_tombstone(sender, instance, **kwargs):
+    RecipeTombstone.objects.create(recipe_id=instance.pk)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_image = Recipe.objects.filter(
+        pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+def cleanup_replaced_image(sender, instance, **kwargs):
+    """
+    Прежнее изображение удаляется после фиксации транзакции, если на
+    него не ссылаются другие рецепты (одинаковые файлы общие).
+    """
+
+    previous = getattr(instance, '_previous_image', None)
+    if previous and previous != instance.image.name:
+        schedule_image_cleanup(previous)
+
+
+@receiver(post_delete, sender=Recipe)
+def cleanup_deleted_recipe_image(sender, instance, **kwargs):
+    schedule_image_cleanup(instance.image.name)
@@ -0,0 +1,169 @@
+import hashlib
+import random
+from array import array
+from collections import defaultdict
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Recipe, RecipeBucket, RecipeIngredient, RecipeSignature
+
+# Подпись из NUM_PERM минимумов делится на BANDS полос по ROWS значений.
+# Рецепты попадают в кандидаты, если совпала хотя бы одна полоса:
+# вероятность этого 1 - (1 - J ** ROWS) ** BANDS для сходства Жаккара J.
+# После изменения констант индекс нужно перестроить.
+NUM_PERM = 64
+ROWS = 3
+BANDS = NUM_PERM // ROWS
+HASH_SEED = 20221001
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+# Кандидаты с наибольшим числом совпавших полос, затем лучшие по
+# оценке сходства подписей, которые ранжируются по точному Жаккару.
+MAX_CANDIDATES = 500
+RERANK_FACTOR = 5
+REBUILD_BATCH_SIZE = 1000
+
+_rnd = random.Random(HASH_SEED)
+PERMUTATIONS = tuple(
+    (_rnd.randrange(1, MERSENNE_PRIME), _rnd.randrange(0, MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+)
+
+
+def get_features(recipe_ids):
+    """
+    Признаки рецептов: id ингредиентов (чётные числа) и тэгов (нечётные).
+    """
+
+    features = defaultdict(set)
+    ingredients = RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).values_list('recipe_id', 'ingredient_id')
+    for recipe_id, ingredient_id in ingredients:
+        features[recipe_id].add(ingredient_id * 2)
+    tags = Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids).values_list('recipe_id', 'tag_id')
+    for recipe_id, tag_id in tags:
+        features[recipe_id].add(tag_id * 2 + 1)
+    return features
+
+
+@lru_cache(maxsize=65536)
+def hash_feature(feature):
+    return tuple(
+        (a * feature + b) % MERSENNE_PRIME & MAX_HASH
+        for a, b in PERMUTATIONS
+    )
+
+
+def get_signature(features):
+    return array('I', map(min, zip(*map(hash_feature, features))))
+
+
+def get_buckets(signature):
+    return [
+        (band, int.from_bytes(hashlib.blake2b(
+            signature[band * ROWS:(band + 1) * ROWS].tobytes(),
+            digest_size=8).digest(), 'big', signed=True))
+        for band in range(BANDS)
+    ]
+
+
+def load_signature(value):
+    signature = array('I')
+    signature.frombytes(bytes(value))
+    return signature
+
+
+def jaccard(first, second):
+    return len(first & second) / len(first | second)
+
+
+def index_recipes(recipe_ids):
+    """ Пересчёт подписей и корзин LSH для переданных рецептов. """
+
+    features = get_features(recipe_ids)
+    signatures = []
+    buckets = []
+    for recipe_id, recipe_features in features.items():
+        signature = get_signature(recipe_features)
+        signatures.append(RecipeSignature(
+            recipe_id=recipe_id, signature=signature.tobytes()))
+        buckets.extend(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for band, bucket in get_buckets(signature)
+        )
+    with transaction.atomic():
+        RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.bulk_create(signatures)
+        RecipeBucket.objects.bulk_create(buckets)
+
+
+def schedule_index_recipe(recipe_id):
+    """
+    Индексация рецепта после фиксации транзакции. Вызывается там, где
+    меняются ингредиенты и тэги: сериализатор рецепта, админка; импорт
+    индексирует пачками сам.
+    """
+
+    transaction.on_commit(lambda: index_recipes([recipe_id]))
+
+
+def rebuild_index(batch_size=REBUILD_BATCH_SIZE):
+    """ Полное перестроение индекса пачками рецептов; вернёт их число. """
+
+    RecipeBucket.objects.all().delete()
+    RecipeSignature.objects.all().delete()
+    count = 0
+    last_id = 0
+    while True:
+        recipe_ids = list(Recipe.objects.filter(
+            id__gt=last_id
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not recipe_ids:
+            return count
+        index_recipes(recipe_ids)
+        count += len(recipe_ids)
+        last_id = recipe_ids[-1]
+
+
+def find_similar(recipe_id, limit):
+    """
+    id рецептов с общими ингредиентами и тэгами, от самых похожих.
+    Кандидаты берутся из совпавших корзин LSH, отбираются по оценке
+    сходства MinHash-подписей и ранжируются по точному коэффициенту
+    Жаккара.
+    """
+
+    features = get_features([recipe_id]).get(recipe_id)
+    if not features:
+        return []
+    signature = get_signature(features)
+    candidates = RecipeBucket.objects.filter(reduce(or_, (
+        Q(band=band, bucket=bucket)
+        for band, bucket in get_buckets(signature)
+    ))).exclude(recipe_id=recipe_id).values('recipe_id').annotate(
+        hits=Count('id')).order_by('-hits', 'recipe_id').values_list(
+            'recipe_id', flat=True)[:MAX_CANDIDATES]
+
+    estimated = []
+    for candidate_id, value in RecipeSignature.objects.filter(
+            recipe_id__in=list(candidates)).values_list(
+                'recipe_id', 'signature'):
+        matches = sum(
+            x == y for x, y in zip(signature, load_signature(value)))
+        estimated.append((-matches, candidate_id))
+    estimated.sort()
+    rerank_ids = [
+        candidate_id for _, candidate_id in estimated[:limit * RERANK_FACTOR]
+    ]
+
+    candidate_features = get_features(rerank_ids)
+    ranked = sorted(
+        (-jaccard(features, candidate_features[candidate_id]), candidate_id)
+        for candidate_id in rerank_ids
+    )
+    return [candidate_id for _, candidate_id in ranked[:limit]]
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import posixpath
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла - SHA-256 его содержимого:
+    recipes/ab/ab12...ef.jpg. Одинаковые загрузки ссылаются на один файл,
+    поэтому файл можно удалять, только когда на него не ссылается ни один
+    объект (см. delete_unreferenced_image).
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), hexdigest[:2], hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от удаления (gc_media,
+            # delete_unreferenced_image), пока ссылающийся на него объект
+            # ещё не сохранён.
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Файл удалили после проверки - он записывается заново.
+                pass
+        return super().save(name, content, max_length)
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return image_storage
+
+
+def is_recently_modified(name):
+    try:
+        modified = os.path.getmtime(image_storage.path(name))
+    except FileNotFoundError:
+        return False
+    return modified > time.time() - settings.MEDIA_GC_MIN_AGE
+
+
+def delete_unreferenced_image(name):
+    """
+    Удаление файла, на который не ссылается ни один рецепт. Файлы моложе
+    MEDIA_GC_MIN_AGE остаются: их могла повторно загрузить транзакция,
+    которая ещё не сохранила рецепт. Если ссылка так и не появится,
+    файл удалит gc_media.
+    """
+
+    from .models import Recipe
+
+    if (name and not Recipe.objects.filter(image=name).exists()
+            and not is_recently_modified(name)):
+        image_storage.delete(name)
+
+
+def schedule_image_cleanup(name):
+    """ Удаление файла после фиксации транзакции, если он больше не нужен. """
+
+    if name:
+        transaction.on_commit(lambda: delete_unreferenced_image(name))
@@ -0,0 +1,390 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.admin import site
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from users.admin import SubscriptionAdmin
+from users.models import Subscription, User
+
+from . import reference, similarity
+from .admin import FavoriteAdmin
+from .memberships import load_memberships
+from .models import (Favorite, Ingredient, Recipe, RecipeBucket,
+                     RecipeIngredient, RecipeSignature, ShoppingCart, Tag)
+from .similarity import find_similar, rebuild_index
+from .storage import delete_unreferenced_image, image_storage
+from .transfer import RecipeImporter, RecordError
+
+THREADS = 8
+GIF_DATA_URI = ('data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///'
+                'yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+
+class ConcurrentToggleTest(TransactionTestCase):
+    """
+    Параллельные добавления одного рецепта в избранное или список покупок:
+    связь создаётся один раз, без IntegrityError и 500.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            image='recipes/recipe.gif', cooking_time=10)
+
+    def post_in_parallel(self, url):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                statuses.append(client.post(url).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def assert_added_once(self, action, model):
+        statuses = self.post_in_parallel(
+            f'/api/recipes/{self.recipe.id}/{action}/')
+        self.assertEqual(statuses, [201] + [400] * (THREADS - 1))
+        self.assertEqual(
+            model.objects.filter(user=self.user, recipe=self.recipe).count(),
+            1)
+
+    def test_parallel_favorite(self):
+        self.assert_added_once('favorite', Favorite)
+
+    def test_parallel_shopping_cart(self):
+        self.assert_added_once('shopping_cart', ShoppingCart)
+
+
+class MembershipInvalidationTest(TestCase):
+    """
+    Изменения связей сбрасывают кеш, а удаление из API остаётся одним
+    DELETE без выборки строк.
+    """
+
+    def setUp(self):
+        # id пользователей повторяются между тестами, а кеши - нет.
+        for cache in caches.all():
+            cache.clear()
+        self.user, self.author = [
+            User.objects.create_user(
+                username=username, email=f'{username}@example.com',
+                first_name='Имя', last_name='Фамилия', password='pass')
+            for username in ('user', 'author')
+        ]
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            image='recipes/recipe.gif', cooking_time=10)
+
+    def assert_memberships(self, model, ids):
+        self.assertEqual(load_memberships(model, self.user.id), ids)
+
+    def test_save_and_remove_invalidate(self):
+        for model in (Favorite, ShoppingCart):
+            with self.subTest(model=model.__name__):
+                self.assert_memberships(model, frozenset())
+                with self.captureOnCommitCallbacks(execute=True):
+                    model.objects.create(user=self.user, recipe=self.recipe)
+                self.assert_memberships(model, {self.recipe.id})
+                with self.captureOnCommitCallbacks(execute=True):
+                    with self.assertNumQueries(1):
+                        self.assertTrue(model.objects.remove(
+                            self.user, self.recipe.id))
+                self.assert_memberships(model, frozenset())
+
+    def test_clear_is_single_delete(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.assert_memberships(ShoppingCart, {self.recipe.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertNumQueries(1):
+                ShoppingCart.objects.remove_many(self.user)
+        self.assert_memberships(ShoppingCart, frozenset())
+
+    def test_admin_delete_invalidates(self):
+        for model, admin_class, related_field, related in (
+                (Favorite, FavoriteAdmin, 'recipe', self.recipe),
+                (Subscription, SubscriptionAdmin, 'author', self.author)):
+            with self.subTest(model=model.__name__):
+                model_admin = admin_class(model, site)
+                with self.captureOnCommitCallbacks(execute=True):
+                    link = model.objects.create(
+                        user=self.user, **{related_field: related})
+                self.assert_memberships(model, {related.id})
+                with self.captureOnCommitCallbacks(execute=True):
+                    model_admin.delete_model(None, link)
+                self.assert_memberships(model, frozenset())
+                with self.captureOnCommitCallbacks(execute=True):
+                    model.objects.create(
+                        user=self.user, **{related_field: related})
+                self.assert_memberships(model, {related.id})
+                with self.captureOnCommitCallbacks(execute=True):
+                    model_admin.delete_queryset(
+                        None, model.objects.filter(user=self.user))
+                self.assert_memberships(model, frozenset())
+
+
+class StaleReferenceSnapshotTest(TestCase):
+    """
+    Справочник изменён в другом процессе без сдвига версии: снимок
+    процесса не должен отклонять или терять новые записи.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        for cache in caches.all():
+            cache.clear()
+        reference.get_reference_data()
+        # bulk_create не отправляет сигналов, как и запись из другого
+        # процесса с локальным кешем версий.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='мука', measurement_unit='г')])
+        Tag.objects.bulk_create(
+            [Tag(name='Завтрак', color='#E26C2D', slug='breakfast')])
+        self.ingredient = Ingredient.objects.get()
+        self.tag = Tag.objects.get()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def test_create_and_read_recipe(self):
+        response = self.client.post('/api/recipes/', {
+            'name': 'Блины', 'text': 'Описание', 'cooking_time': 20,
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 200}],
+            'image': GIF_DATA_URI,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get()
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['ingredients'][0]['name'], 'мука')
+        self.assertEqual(response.json()['tags'][0]['slug'], 'breakfast')
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.json()['results'][0]['ingredients'][0]['name'], 'мука')
+
+    def test_unknown_ingredient_rejected(self):
+        snapshot = reference.get_reference_data()
+        self.assertEqual(
+            snapshot.find_unknown_ingredients([self.ingredient.id, 0]), {0})
+        self.assertTrue(snapshot.stale)
+        self.assertIn(self.ingredient.id,
+                      reference.get_reference_data().ingredients)
+
+
+class SimilarityIndexTest(TestCase):
+    """
+    Создание и изменение рецепта через API индексируют его один раз;
+    записанные в обход API рецепты индексирует rebuild_index.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        self.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар', 'соль')
+        ]
+        self.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.author, name=name, text='Описание',
+            image='recipes/recipe.gif', cooking_time=10)
+
+    def send_recipe(self, method, url, ingredients):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with mock.patch('recipes.similarity.index_recipes',
+                        wraps=similarity.index_recipes) as index_recipes:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(client, method)(url, {
+                    'name': 'Блины', 'text': 'Описание', 'cooking_time': 20,
+                    'tags': [self.tag.id],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': 100}
+                        for ingredient in ingredients
+                    ],
+                    'image': GIF_DATA_URI,
+                }, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        self.assertEqual(index_recipes.call_count, 1)
+        return response.json()['id']
+
+    def test_indexed_once_per_request(self):
+        first_id, second_id = [
+            self.send_recipe('post', '/api/recipes/', self.ingredients)
+            for _ in range(2)
+        ]
+        self.assertEqual(find_similar(first_id, 10), [second_id])
+        self.send_recipe('patch', f'/api/recipes/{second_id}/',
+                         self.ingredients[:1])
+        self.assertEqual(
+            RecipeBucket.objects.filter(recipe_id=second_id).count(),
+            similarity.BANDS)
+        self.assertNotEqual(
+            RecipeSignature.objects.get(recipe_id=first_id).signature,
+            RecipeSignature.objects.get(recipe_id=second_id).signature)
+
+    def test_rebuild_index(self):
+        recipes = [self.create_recipe(name) for name in ('Блины', 'Оладьи')]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=100)
+            for recipe in recipes for ingredient in self.ingredients)
+        self.assertFalse(RecipeSignature.objects.exists())
+        self.assertEqual(rebuild_index(batch_size=1), 2)
+        self.assertEqual(find_similar(recipes[0].id, 10), [recipes[1].id])
+
+
+class ImportImagePathTest(TestCase):
+    """ Импорт не читает файлы за пределами каталога изображений. """
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.images_dir = os.path.join(root, 'export')
+        os.makedirs(os.path.join(self.images_dir, 'images'))
+        with open(os.path.join(root, 'secret.gif'), 'wb') as file:
+            file.write(b'secret')
+        with open(os.path.join(self.images_dir, 'images', 'recipe.gif'),
+                  'wb') as file:
+            file.write(b'GIF89a')
+        os.symlink(os.path.join(root, 'secret.gif'),
+                   os.path.join(self.images_dir, 'images', 'link.gif'))
+        media_settings = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.importer = RecipeImporter(images_dir=self.images_dir)
+
+    def test_outside_paths_rejected(self):
+        for value in ('../secret.gif', 'images/../../secret.gif',
+                      os.path.join(os.path.dirname(self.images_dir),
+                                   'secret.gif'),
+                      'images/link.gif'):
+            with self.subTest(value=value):
+                with self.assertRaises(RecordError):
+                    self.importer.get_image(value)
+
+    def test_image_copied(self):
+        name = self.importer.get_image('images/recipe.gif')
+        with self.importer.image_field.storage.open(name) as file:
+            self.assertEqual(file.read(), b'GIF89a')
+
+
+class UnreferencedImageCleanupTest(TestCase):
+    """
+    Файл без ссылок удаляется, только если его давно не загружали
+    повторно.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.name = image_storage.save(
+            'recipes/recipe.gif', ContentFile(b'GIF89a'))
+
+    def test_recent_file_kept(self):
+        delete_unreferenced_image(self.name)
+        self.assertTrue(image_storage.exists(self.name))
+
+    def test_old_file_deleted(self):
+        os.utime(image_storage.path(self.name), (0, 0))
+        delete_unreferenced_image(self.name)
+        self.assertFalse(image_storage.exists(self.name))
+
+
+class RecipeImporterTest(TestCase):
+    """ Проверка записей импорта и привязка строк к созданным рецептам. """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.image = image_storage.save(
+            'recipes/recipe.gif', ContentFile(b'GIF89a'))
+        User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия', password='pass')
+        for slug, color in (('breakfast', '#E26C2D'), ('lunch', '#49B64E')):
+            Tag.objects.create(name=slug, color=color, slug=slug)
+        for name in ('мука', 'молоко'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        self.importer = RecipeImporter()
+
+    def get_record(self, name, ingredient='мука', tag='breakfast', **fields):
+        return {
+            'author': 'author', 'name': name, 'text': 'Описание',
+            'image': self.image, 'cooking_time': 10,
+            'ingredients': [{'name': ingredient, 'measurement_unit': 'г',
+                             'amount': 100}],
+            'tags': [tag], **fields,
+        }
+
+    def test_bool_numbers_rejected(self):
+        records = [
+            (1, self.get_record('Рецепт', cooking_time=True)),
+            (2, self.get_record('Рецепт', ingredients=[
+                {'name': 'мука', 'measurement_unit': 'г', 'amount': True}])),
+        ]
+        loaded, errors = self.importer.import_chunk(records)
+        self.assertEqual(loaded, 0)
+        self.assertEqual(errors, [
+            (1, 'Некорректное время приготовления.'),
+            (2, 'Некорректное количество: мука.'),
+        ])
+
+    def test_rows_linked_to_created_recipes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            loaded, errors = self.importer.import_chunk([
+                (1, self.get_record('Блины')),
+                (2, self.get_record('Пропущен', cooking_time=0)),
+                (3, self.get_record('Суп', 'молоко', 'lunch')),
+            ])
+        self.assertEqual(loaded, 2)
+        self.assertEqual([number for number, _ in errors], [2])
+        self.assertEqual(
+            set(Recipe.objects.values_list(
+                'name', 'ingredients__name', 'tags__slug')),
+            {('Блины', 'мука', 'breakfast'), ('Суп', 'молоко', 'lunch')})
@@ -0,0 +1,243 @@
+import os
+from collections import defaultdict
+from itertools import islice
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.db import connections, router, transaction
+
+from users.models import User
+
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+from .similarity import index_recipes
+
+CHUNK_SIZE = 2000
+RECIPE_TYPE = 'recipe'
+# В архиве выгрузки аккаунта изображения лежат в каталоге images/.
+ARCHIVE_IMAGES_DIR = 'images'
+INVALID_RECORD_MSG = 'Некорректная структура записи.'
+
+
+class RecordError(Exception):
+    """ Запись импорта не может быть загружена. """
+
+
+def is_positive_int(value):
+    # bool - подкласс int: true в JSON не должно становиться единицей.
+    return (isinstance(value, int) and not isinstance(value, bool)
+            and value >= 1)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_recipe_records(recipes, image_value):
+    """
+    Рецепты в формате выгрузки пачками по CHUNK_SIZE: ингредиенты и
+    тэги каждой пачки загружаются двумя запросами. image_value
+    преобразует имя файла изображения в хранилище.
+    """
+
+    recipes = recipes.order_by('id').values(
+        'id', 'author__username', 'name', 'text', 'image', 'cooking_time',
+        'added_at'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    for chunk in chunked(recipes, CHUNK_SIZE):
+        ids = [recipe['id'] for recipe in chunk]
+        ingredients = defaultdict(list)
+        for recipe_id, name, unit, amount in RecipeIngredient.objects.filter(
+                recipe_id__in=ids).order_by('id').values_list(
+                    'recipe_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount'):
+            ingredients[recipe_id].append(
+                {'name': name, 'measurement_unit': unit, 'amount': amount})
+        tags = defaultdict(list)
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=ids).order_by('id').values_list(
+                    'recipe_id', 'tag__slug'):
+            tags[recipe_id].append(slug)
+        for recipe in chunk:
+            recipe['author'] = recipe.pop('author__username')
+            recipe['image'] = image_value(recipe['image'])
+            recipe['ingredients'] = ingredients[recipe['id']]
+            recipe['tags'] = tags[recipe['id']]
+            yield recipe
+
+
+class RecipeImporter:
+    """
+    Загрузка рецептов из записей выгрузки пачками: каждая пачка - одна
+    транзакция с bulk_create для рецептов, их ингредиентов и тэгов.
+    Тэги (по slug или названию), ингредиенты (по названию и единице
+    измерения) и авторы находятся по словарям в памяти.
+    """
+
+    def __init__(self, default_author=None, images_dir=None):
+        self.default_author = default_author
+        self.images_dir = (
+            None if images_dir is None else os.path.realpath(images_dir))
+        self.tags = {}
+        for tag_id, name, slug in Tag.objects.values_list(
+                'id', 'name', 'slug'):
+            self.tags[name] = self.tags[slug] = tag_id
+        self.ingredients = {}
+        units = defaultdict(set)
+        for ingredient_id, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'):
+            self.ingredients[name, unit] = ingredient_id
+            units[name].add(ingredient_id)
+        # Без единицы измерения ингредиент находится, если она одна.
+        for name, ids in units.items():
+            if len(ids) == 1:
+                self.ingredients[name, None] = next(iter(ids))
+        self.authors = {}
+        self.image_field = Recipe._meta.get_field('image')
+
+    def get_author_ids(self, records):
+        usernames = {
+            record.get('author') for _, record in records
+        } - set(self.authors) - {None}
+        self.authors.update(User.objects.filter(
+            username__in=usernames).values_list('username', 'id'))
+
+    def get_author_id(self, record):
+        username = record.get('author')
+        if username is None and self.default_author is not None:
+            return self.default_author.id
+        if username not in self.authors:
+            raise RecordError(f'Неизвестный автор: {username}.')
+        return self.authors[username]
+
+    def get_image(self, value):
+        """
+        Имя изображения в хранилище. Файл из каталога images_dir (например,
+        распакованного архива выгрузки) копируется в хранилище, иначе
+        изображение должно уже быть в хранилище. Пути за пределами
+        images_dir и хранилища (../, абсолютные, символические ссылки)
+        отклоняются.
+        """
+
+        if not value:
+            raise RecordError('Не указано изображение.')
+        if self.images_dir is not None:
+            path = os.path.realpath(os.path.join(self.images_dir, value))
+            if os.path.commonpath([self.images_dir, path]) != self.images_dir:
+                raise RecordError(
+                    f'Изображение вне каталога изображений: {value}.')
+            if os.path.isfile(path):
+                name = value
+                if name.startswith(f'{ARCHIVE_IMAGES_DIR}/'):
+                    name = name[len(ARCHIVE_IMAGES_DIR) + 1:]
+                with open(path, 'rb') as file:
+                    return self.image_field.storage.save(
+                        self.image_field.generate_filename(
+                            None, os.path.basename(name)),
+                        File(file))
+        try:
+            if self.image_field.storage.exists(value):
+                return value
+        except SuspiciousFileOperation:
+            raise RecordError(f'Изображение вне хранилища: {value}.')
+        raise RecordError(f'Изображение не найдено: {value}.')
+
+    def get_ingredients(self, record):
+        ingredients = {}
+        for item in record.get('ingredients') or ():
+            key = (item.get('name'), item.get('measurement_unit'))
+            ingredient_id = self.ingredients.get(key)
+            if ingredient_id is None:
+                raise RecordError(f'Неизвестный ингредиент: {key[0]}.')
+            amount = item.get('amount')
+            if not is_positive_int(amount):
+                raise RecordError(f'Некорректное количество: {key[0]}.')
+            if ingredient_id in ingredients:
+                raise RecordError(f'Ингредиент повторяется: {key[0]}.')
+            ingredients[ingredient_id] = amount
+        if not ingredients:
+            raise RecordError('Не указаны ингредиенты.')
+        return ingredients
+
+    def get_tags(self, record):
+        tags = set()
+        for tag in record.get('tags') or ():
+            if tag not in self.tags:
+                raise RecordError(f'Неизвестный тэг: {tag}.')
+            tags.add(self.tags[tag])
+        if not tags:
+            raise RecordError('Не указаны тэги.')
+        return tags
+
+    def build_recipe(self, record):
+        cooking_time = record.get('cooking_time')
+        if not is_positive_int(cooking_time):
+            raise RecordError('Некорректное время приготовления.')
+        if not record.get('name') or not record.get('text'):
+            raise RecordError('Не указаны название или описание.')
+        recipe = Recipe(
+            author_id=self.get_author_id(record),
+            name=record['name'],
+            text=record['text'],
+            cooking_time=cooking_time,
+        )
+        ingredients = self.get_ingredients(record)
+        tags = self.get_tags(record)
+        recipe.image = self.get_image(record.get('image'))
+        return recipe, ingredients, tags
+
+    def import_chunk(self, records):
+        """
+        Загрузка пачки пар (номер, запись). Возвращает число загруженных
+        рецептов и список ошибок (номер записи, текст) для пропущенных.
+        Изображения копируются в хранилище до начала транзакции.
+        """
+
+        self.get_author_ids(records)
+        loaded = []
+        errors = []
+        for number, record in records:
+            try:
+                loaded.append(self.build_recipe(record))
+            except RecordError as error:
+                errors.append((number, str(error)))
+            except (AttributeError, TypeError):
+                errors.append((number, INVALID_RECORD_MSG))
+        with transaction.atomic():
+            recipe_ids = self.create_recipes(
+                [recipe for recipe, _, _ in loaded])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe_id=recipe_id, ingredient_id=item,
+                                 amount=amount)
+                for recipe_id, (_, ingredients, _) in zip(recipe_ids, loaded)
+                for item, amount in ingredients.items()
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id, (_, _, tags) in zip(recipe_ids, loaded)
+                for tag_id in tags
+            )
+            transaction.on_commit(lambda: index_recipes(recipe_ids))
+        return len(recipe_ids), errors
+
+    def create_recipes(self, recipes):
+        """
+        id созданных рецептов в порядке списка. Если БД не возвращает id
+        из bulk_create (SQLite), рецепты вставляются по одному: id по
+        порядку после Max(id) не гарантированы - между чтением максимума
+        и вставкой может записать другой процесс.
+        """
+
+        if not recipes:
+            return []
+        connection = connections[router.db_for_write(Recipe)]
+        if connection.features.can_return_rows_from_bulk_insert:
+            return [recipe.pk
+                    for recipe in Recipe.objects.bulk_create(recipes)]
+        for recipe in recipes:
+            recipe.save(force_insert=True)
+        return [recipe.pk for recipe in recipes]
@@ -0,0 +1,49 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+VERSION_KEY = 'data-version:{name}'
+
+
+def new_version():
+    # Версия от времени, а не с единицы: после вытеснения ключа из кеша
+    # новая версия не совпадёт со старой, закешированной в процессах.
+    return time.time_ns()
+
+
+def get_version(name):
+    """ Текущая версия именованных данных, общая для всех процессов. """
+
+    cache = caches[settings.SHARED_CACHE]
+    key = VERSION_KEY.format(name=name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """
+    Сдвиг версии именованных данных после их изменения. Новая версия
+    записывается целиком, а не через incr, который не атомарен в файловом
+    кеше: при одновременных сдвигах версия всё равно меняется.
+    """
+
+    version = new_version()
+    caches[settings.SHARED_CACHE].set(
+        VERSION_KEY.format(name=name), version, timeout=None)
+    return version
+
+
+def get_data_version(model):
+    """ Текущая версия данных модели. """
+
+    return get_version(model._meta.label_lower)
+
+
+def bump_data_version(model):
+    """ Сдвиг версии данных модели после их изменения. """
+
+    return bump_version(model._meta.label_lower)
@@ -1,18 +1,30 @@
 from django.contrib import admin
 
+from .admin_tools import (EstimatedCountPaginator, MembershipAdminMixin,
+                          id_input_filter)
 from .models import Subscription, User
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'first_name', 'last_name')
-    search_fields = ('username', 'email')
-    list_filter = ('username', 'email')
+    search_fields = ('^username', '^email')
+    ordering = ('id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(MembershipAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
-    search_fields = ('user', 'author')
+    list_filter = (
+        id_input_filter('user', 'id подписчика'),
+        id_input_filter('author', 'id автора'),
+    )
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
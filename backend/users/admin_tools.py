@@ -0,0 +1,101 @@
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from recipes.memberships import invalidate_memberships
+
+# Ниже этого числа строк оценка заменяется точным COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def get_estimated_count(queryset):
+    """
+    Число строк нефильтрованной таблицы по статистике планировщика
+    PostgreSQL или None, если оценка неприменима.
+    """
+
+    connection = connections[queryset.db]
+    query = queryset.query
+    if (connection.vendor != 'postgresql' or query.where
+            or query.distinct or query.combinator):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списков админки для больших таблиц: без фильтров число
+    объектов берётся из статистики PostgreSQL вместо COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        estimate = get_estimated_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class IdInputFilter(admin.SimpleListFilter):
+    """
+    Фильтр по id связанного объекта с полем ввода вместо списка всех
+    вариантов, который для больших таблиц не помещается на страницу.
+    """
+
+    template = 'admin/id_input_filter.html'
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        return (('', ''),)
+
+    def choices(self, changelist):
+        query_parts = [
+            (name, value) for name, value in changelist.params.items()
+            if name not in (self.parameter_name, PAGE_VAR)
+        ]
+        yield {
+            'query_parts': query_parts,
+            'query_string': changelist.get_query_string(
+                remove=[self.parameter_name]),
+        }
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(**{f'{self.field_name}_id': value})
+        return queryset
+
+
+def id_input_filter(field_name, title):
+    return type(f'{field_name.title()}IdInputFilter', (IdInputFilter,), {
+        'title': title,
+        'parameter_name': f'{field_name}_id',
+        'field_name': field_name,
+    })
+
+
+class MembershipAdminMixin:
+    """
+    Сброс закешированных множеств связей пользователей при удалении из
+    админки: сигнала post_delete у этих моделей нет, чтобы удаление из
+    API оставалось одним DELETE.
+    """
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_memberships(self.model, obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for user_id in user_ids:
+            invalidate_memberships(self.model, user_id)
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.10 on 2026-10-19 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_subscription'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['author', 'user'], name='subscription_author_user_idx'),
+        ),
+    ]
@@ -47,6 +47,10 @@ class Subscription(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_subscription'),
         )
+        indexes = (
+            models.Index(fields=['author', 'user'],
+                         name='subscription_author_user_idx'),
+        )
 
     def __str__(self):
         return f'Пользователь {self.user} подписан на {self.author}'